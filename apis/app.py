@@ -1,30 +1,131 @@
-from typing import List
-from fastapi import FastAPI, HTTPException, Depends
-from sqlalchemy.orm import Session
-from datetime import datetime
+import hashlib
+import json
+import logging
+from typing import List, Optional
+from fastapi import FastAPI, HTTPException, Depends, Header, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import ValidationError
+from sqlalchemy import insert, select
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session, selectinload
+from contextlib import aclosing, asynccontextmanager
+from datetime import datetime, timedelta
 
 from models.user import (
+    UserLogin,
+    ExerciseAssign,
     LSASSurveyCreate,
     LSASSurveyResponse,
     LSASSurveyResult,
+    LSASSurveyImport,
+    LSASBulkImportResult,
     DoctorCreate,
     DoctorResponse,
     PatientCreate,
     PatientResponse,
 )
+from models.progress import (
+    LSASProgress,
+    LSASScorePoint,
+    PatientAnalytics,
+    PatientLatestSurvey,
+)
+from models.exercise import (
+    DoctorExerciseCompletion,
+    ExerciseBulkAssign,
+    ExerciseFeed,
+    ExerciseResponse,
+)
+from models.recommendation import (
+    RecommendationBatchProgress,
+    RecommendationJobResponse,
+    RecommendationResponse,
+)
 from models.lsas import (
     get_anxiety_level,
-    FearLevel,
-    AvoidanceLevel,
-    Question,
     LSASQuestions,
+    LSAS_QUESTION_IDS,
+    LSAS_QUESTIONS,
+)
+from database.engine import async_engine, engine
+from database.utils import get_db, get_read_db
+from database.database_creation import (
+    DB_CREATE_SCHEMA,
+    AssignedExercise,
+    LSASSurvey,
+    Patient,
+    Doctor,
+    PatientSurveyStats,
+    Recommendation,
+    RecommendationBatch,
+    RecommendationJob,
+    check_schema,
+    create_schema,
+)
+from database.patient_stats import record_surveys
+from cohort_analytics import get_cohort_analytics
+from recommendations import (
+    batch_progress_query,
+    create_recommendation_batch,
+    recommendation_pool,
+)
+from llm_cache import llm_cache
+from prompt_templates import get_prompt_registry
+from database.queries import (
+    execute_read,
+    exercise_completion_by_patient,
+    exercise_feed_page,
+    latest_surveys_for_doctor,
+    rows_as_dicts,
+    summary_points_page,
+    survey_points_page,
+    survey_score_buckets,
+)
+from database.lsas_responses import pack_responses
+from database.exports import (
+    EXPORT_CHUNK_SIZE,
+    EXPORT_DATASETS,
+    EXPORT_FORMATS,
+    parquet_available,
+    stream_export,
+)
+from metrics import MetricsMiddleware, instrument_engine, render_metrics
+from credentials import PasswordHasherBusy, password_hasher
+from response_cache import doctor_scope, patient_scope, response_cache
+from survey_writer import (
+    SURVEY_GROUP_COMMIT,
+    PatientNotFound,
+    survey_writer,
+    write_surveys,
 )
-from database.utils import get_db
-from database.database_creation import LSASSurvey, Patient, Doctor
 
 from fastapi.middleware.cors import CORSMiddleware
 
-app = FastAPI()
+logger = logging.getLogger(__name__)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Nothing touches the database or starts workers at import time; it all
+    # happens here, in order, before the first request is accepted
+    if DB_CREATE_SCHEMA:
+        await run_in_threadpool(create_schema, engine)
+    else:
+        await run_in_threadpool(check_schema, engine)
+    # Read and compile prompts/ before the first request needs them
+    get_prompt_registry()
+    instrument_engine(engine)
+    instrument_engine(async_engine.sync_engine)
+    await recommendation_pool.start()
+    if SURVEY_GROUP_COMMIT:
+        await survey_writer.start()
+    yield
+    await survey_writer.stop()
+    await recommendation_pool.stop()
+    password_hasher.shutdown()
+
+
+app = FastAPI(lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:3000"],  # Frontend URL
@@ -32,11 +133,58 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(MetricsMiddleware)
+
+
+async def _on_password_pool(call, *args):
+    # Hashing is refused rather than queued once the pool is saturated
+    try:
+        return await call(*args)
+    except PasswordHasherBusy:
+        raise HTTPException(
+            status_code=503,
+            detail="Too many requests, try again shortly",
+            headers={"Retry-After": "1"},
+        )
+
+
+async def _login(model, credentials: UserLogin, db: Session):
+    user = await run_in_threadpool(
+        lambda: db.query(model).filter(model.username == credentials.username).first()
+    )
+    valid = await _on_password_pool(
+        password_hasher.verify,
+        credentials.password,
+        user.hashed_password if user else None,
+    )
+    if not valid:
+        raise HTTPException(status_code=401, detail="Incorrect username or password")
+
+    # Upgrade plaintext and outdated hashes while the password is at hand
+    if password_hasher.needs_rehash(user.hashed_password):
+        user.hashed_password = await _on_password_pool(
+            password_hasher.hash, credentials.password
+        )
+
+        def save():
+            db.commit()
+            db.refresh(user)
+
+        await run_in_threadpool(save)
+    return user
 
 
 # User Registration Routes
 @app.post("/doctors/register", response_model=DoctorResponse)
-def register_doctor(doctor: DoctorCreate, db: Session = Depends(get_db)):
+async def register_doctor(doctor: DoctorCreate, db: Session = Depends(get_db)):
+    # Hashing runs on the password pool, the database work in the threadpool.
+    # Registrations that will be refused are refused before the costly hash
+    await run_in_threadpool(_check_new_doctor, db, doctor)
+    hashed_password = await _on_password_pool(password_hasher.hash, doctor.password)
+    return await run_in_threadpool(_create_doctor, db, doctor, hashed_password)
+
+
+def _check_new_doctor(db: Session, doctor: DoctorCreate):
     # Check if username exists
     db_doctor = db.query(Doctor).filter(Doctor.username == doctor.username).first()
     if db_doctor:
@@ -47,11 +195,16 @@ def register_doctor(doctor: DoctorCreate, db: Session = Depends(get_db)):
     if db_doctor:
         raise HTTPException(status_code=400, detail="Email already registered")
 
+
+def _create_doctor(db: Session, doctor: DoctorCreate, hashed_password: str):
+    # Checked again: another registration may have won while hashing
+    _check_new_doctor(db, doctor)
+
     # Create new doctor
     db_doctor = Doctor(
         username=doctor.username,
         email=doctor.email,
-        hashed_password=doctor.password,  # In production, use proper password hashing
+        hashed_password=hashed_password,
         name=doctor.name,
         specialization=doctor.specialization,
     )
@@ -61,25 +214,16 @@ def register_doctor(doctor: DoctorCreate, db: Session = Depends(get_db)):
     return db_doctor
 
 
-@app.post("/patients/{patient_id}/lsas-survey", response_model=LSASSurveyResult)
-def submit_lsas_survey(
-    patient_id: int, survey: LSASSurveyResponse, db: Session = Depends(get_db)
-):
-    # Verify patient exists
-    patient = db.query(Patient).filter(Patient.id == patient_id).first()
-    if not patient:
-        raise HTTPException(status_code=404, detail="Patient not found")
-
+def score_survey(survey: LSASSurveyResponse):
     # Validate we have responses for all 24 questions
-    if len(survey.responses) != 24:
+    if len(survey.responses) != len(LSAS_QUESTION_IDS):
         raise HTTPException(
             status_code=400, detail="Must provide responses for all 24 LSAS questions"
         )
 
     # Validate question IDs
     question_ids = sorted([r.question_id for r in survey.responses])
-    expected_ids = list(range(1, 25))  # 1-24
-    if question_ids != expected_ids:
+    if question_ids != LSAS_QUESTION_IDS:
         raise HTTPException(
             status_code=400, detail="Invalid or duplicate question IDs provided"
         )
@@ -92,23 +236,177 @@ def submit_lsas_survey(
     # Calculate anxiety level
     anxiety_level = get_anxiety_level(total_score)
 
-    # Create survey entry
-    db_survey = LSASSurvey(
-        patient_id=patient_id,
+    return total_score, anxiety_level
+
+
+def _write_survey(db: Session, survey: dict):
+    # One survey in its own transaction; ids come back from RETURNING, so
+    # there is no refresh
+    result = write_surveys(db, [survey])[0]
+    if result is not None:
+        db.commit()
+    return result
+
+
+@app.post("/patients/{patient_id}/lsas-survey", response_model=LSASSurveyResult)
+async def submit_lsas_survey(
+    patient_id: int, survey: LSASSurveyResponse, db: Session = Depends(get_db)
+):
+    total_score, anxiety_level = score_survey(survey)
+    values = {
+        "patient_id": patient_id,
+        "total_score": total_score,
+        "anxiety_level": anxiety_level.value,
+        "packed_responses": pack_responses(survey.responses),
+        "submission_date": datetime.utcnow(),
+    }
+
+    if survey_writer.running:
+        # Group commit: batched with other submissions in this process
+        try:
+            written = await survey_writer.submit(values)
+        except PatientNotFound:
+            written = None
+    else:
+        written = await run_in_threadpool(_write_survey, db, values)
+    if written is None:
+        raise HTTPException(status_code=404, detail="Patient not found")
+    await response_cache.invalidate(
+        patient_scope(patient_id), doctor_scope(written["doctor_id"])
+    )
+
+    # Recommendations are generated by the worker pool, after this returns
+    recommendation_pool.enqueue(written["recommendation_job_id"])
+
+    return LSASSurveyResult(
+        id=written["id"],
+        submission_date=values["submission_date"],
         total_score=total_score,
-        anxiety_level=anxiety_level.value,
-        submission_date=datetime.utcnow(),
+        anxiety_level=values["anxiety_level"],
+        recommendation_job_id=written["recommendation_job_id"],
     )
 
-    db.add(db_survey)
-    db.commit()
-    db.refresh(db_survey)
 
-    return db_survey
+# Surveys per transaction for bulk imports
+BULK_IMPORT_CHUNK_SIZE = 1000
+
+
+def _parse_import_line(line: bytes, line_number: int, chunk: list, result: dict):
+    if not line.strip():
+        return
+
+    try:
+        survey = LSASSurveyImport.model_validate_json(line)
+        total_score, anxiety_level = score_survey(survey)
+    except ValidationError as exc:
+        detail = "; ".join(
+            ": ".join(filter(None, (".".join(map(str, error["loc"])), error["msg"])))
+            for error in exc.errors()
+        )
+        _record_import_error(result, line_number, detail)
+        return
+    except HTTPException as exc:
+        _record_import_error(result, line_number, exc.detail)
+        return
+
+    chunk.append(
+        (
+            line_number,
+            {
+                "patient_id": survey.patient_id,
+                "total_score": total_score,
+                "anxiety_level": anxiety_level.value,
+                "packed_responses": pack_responses(survey.responses),
+                "submission_date": survey.submission_date or datetime.utcnow(),
+            },
+        )
+    )
+
+
+def _record_import_error(result: dict, line_number: int, detail: str):
+    result["failed"] += 1
+    result["errors"].append({"line": line_number, "detail": detail})
+
+
+def _insert_survey_chunk(db: Session, chunk: list, result: dict):
+    # Resolve every patient in the chunk with one query
+    patient_ids = {row["patient_id"] for _, row in chunk}
+    doctors = dict(
+        db.execute(
+            select(Patient.id, Patient.doctor_id).where(Patient.id.in_(patient_ids))
+        ).all()
+    )
+
+    rows = []
+    for line_number, row in chunk:
+        if row["patient_id"] in doctors:
+            rows.append((line_number, row))
+        else:
+            _record_import_error(result, line_number, "Patient not found")
+
+    if not rows:
+        return
+
+    try:
+        # Core insert with a list of parameters runs as a single executemany
+        db.execute(insert(LSASSurvey.__table__), [row for _, row in rows])
+        record_surveys(db, [row for _, row in rows])
+        db.commit()
+    except SQLAlchemyError as exc:
+        db.rollback()
+        for line_number, _ in rows:
+            _record_import_error(result, line_number, f"Database error: {exc}")
+    else:
+        result["inserted"] += len(rows)
+        written = {row["patient_id"] for _, row in rows}
+        response_cache.invalidate_blocking(
+            *(patient_scope(patient_id) for patient_id in written),
+            *(doctor_scope(doctors[patient_id]) for patient_id in written),
+        )
+
+
+@app.post("/lsas-surveys/bulk", response_model=LSASBulkImportResult)
+async def bulk_import_lsas_surveys(request: Request, db: Session = Depends(get_db)):
+    # The body is NDJSON (one LSASSurveyImport per line) and is processed as
+    # it streams in, committing every BULK_IMPORT_CHUNK_SIZE valid surveys
+    result = {"inserted": 0, "failed": 0, "errors": []}
+    chunk = []
+    pending = b""
+    line_number = 0
+
+    async for data in request.stream():
+        pending += data
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            line_number += 1
+            _parse_import_line(line, line_number, chunk, result)
+            if len(chunk) >= BULK_IMPORT_CHUNK_SIZE:
+                await run_in_threadpool(_insert_survey_chunk, db, chunk, result)
+                chunk = []
+
+    if pending.strip():
+        line_number += 1
+        _parse_import_line(pending, line_number, chunk, result)
+    if chunk:
+        await run_in_threadpool(_insert_survey_chunk, db, chunk, result)
+
+    # Missing patients are only found when their chunk is inserted, after
+    # later lines of the chunk have failed to parse
+    result["errors"].sort(key=lambda error: error["line"])
+    return result
 
 
 @app.post("/patients/register", response_model=PatientResponse)
-def register_patient(patient: PatientCreate, db: Session = Depends(get_db)):
+async def register_patient(patient: PatientCreate, db: Session = Depends(get_db)):
+    await run_in_threadpool(_check_new_patient, db, patient)
+    hashed_password = await _on_password_pool(password_hasher.hash, patient.password)
+    db_patient = await run_in_threadpool(_create_patient, db, patient, hashed_password)
+    # The doctor's patient list now includes them
+    await response_cache.invalidate(doctor_scope(db_patient.doctor_id))
+    return db_patient
+
+
+def _check_new_patient(db: Session, patient: PatientCreate):
     # Check if username exists
     db_patient = db.query(Patient).filter(Patient.username == patient.username).first()
     if db_patient:
@@ -124,11 +422,16 @@ def register_patient(patient: PatientCreate, db: Session = Depends(get_db)):
     if not doctor:
         raise HTTPException(status_code=404, detail="Doctor not found")
 
+
+def _create_patient(db: Session, patient: PatientCreate, hashed_password: str):
+    # Checked again: another registration may have won while hashing
+    _check_new_patient(db, patient)
+
     # Create new patient
     db_patient = Patient(
         username=patient.username,
         email=patient.email,
-        hashed_password=patient.password,  # In production, use proper password hashing
+        hashed_password=hashed_password,
         name=patient.name,
         doctor_id=patient.doctor_id,
     )
@@ -138,6 +441,16 @@ def register_patient(patient: PatientCreate, db: Session = Depends(get_db)):
     return db_patient
 
 
+@app.post("/doctors/login", response_model=DoctorResponse)
+async def login_doctor(credentials: UserLogin, db: Session = Depends(get_db)):
+    return await _login(Doctor, credentials, db)
+
+
+@app.post("/patients/login", response_model=PatientResponse)
+async def login_patient(credentials: UserLogin, db: Session = Depends(get_db)):
+    return await _login(Patient, credentials, db)
+
+
 # Get all doctors
 @app.get("/doctors/", response_model=List[DoctorResponse])
 def get_doctors(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
@@ -145,188 +458,568 @@ def get_doctors(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
     return doctors
 
 
-@app.get("/patients/{patient_id}/lsas-progress")
-def get_lsas_progress(
+# Window covered by each lsas-progress timeframe and the bucket size used
+# to aggregate it
+PROGRESS_TIMEFRAMES = {
+    "week": (timedelta(days=7), "day"),
+    "month": (timedelta(days=31), "week"),
+    "year": (timedelta(days=366), "month"),
+}
+
+
+def _encode_progress_cursor(row) -> str:
+    return f"{row.id}:{row.submission_date.isoformat()}"
+
+
+def _decode_progress_cursor(cursor: str):
+    try:
+        survey_id, submission_date = cursor.split(":", 1)
+        return datetime.fromisoformat(submission_date), int(survey_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+async def _survey_points_page(db, patient_id, cursor, limit, since=None):
+    # One page of points, newest first: surveys merged with the monthly
+    # summaries of archived ones. One extra row detects the next page.
+    before_date, before_id = (
+        _decode_progress_cursor(cursor) if cursor else (None, None)
+    )
+    surveys = []
+    for page in (survey_points_page, summary_points_page):
+        result = await execute_read(
+            db,
+            page(
+                patient_id,
+                limit + 1,
+                since=since,
+                before_date=before_date,
+                before_id=before_id,
+            ),
+        )
+        surveys += result.all()
+    surveys.sort(key=lambda row: (row.submission_date, row.id), reverse=True)
+    surveys = surveys[: limit + 1]
+    next_cursor = (
+        _encode_progress_cursor(surveys[limit - 1]) if len(surveys) > limit else None
+    )
+    return surveys[:limit], next_cursor
+
+
+@app.get("/patients/{patient_id}/lsas-progress", response_model=LSASProgress)
+@response_cache.cached("patient_id")
+async def get_lsas_progress(
     patient_id: int,
     timeframe: str,  # 'week', 'month', 'year'
-    db: Session = Depends(get_db),
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    db=Depends(get_read_db),
 ):
-    surveys = (
-        db.query(LSASSurvey)
-        .filter(LSASSurvey.patient_id == patient_id)
-        .order_by(LSASSurvey.submission_date.desc())
-        .all()
+    if timeframe not in PROGRESS_TIMEFRAMES:
+        raise HTTPException(
+            status_code=400, detail="timeframe must be one of: week, month, year"
+        )
+
+    window, bucket = PROGRESS_TIMEFRAMES[timeframe]
+    since = datetime.utcnow() - window
+
+    # Aggregated buckets for the chart: size is bounded by the timeframe
+    result = await execute_read(db, survey_score_buckets(patient_id, since, bucket))
+    buckets = result.all()
+
+    surveys, next_cursor = await _survey_points_page(
+        db, patient_id, cursor, limit, since=since
     )
 
     return {
-        "surveys": [
-            {
-                "date": survey.submission_date,
-                "score": survey.total_score,
-                "anxiety_level": survey.anxiety_level,
-            }
-            for survey in surveys
-        ]
+        "timeframe": timeframe,
+        "bucket": bucket,
+        "since": since,
+        "buckets": rows_as_dicts(buckets),
+        "surveys": rows_as_dicts(surveys),
+        "next_cursor": next_cursor,
     }
 
 
-@app.get("/patients/{patient_id}/latest-lsas")
-def get_latest_lsas(patient_id: int, db: Session = Depends(get_db)):
-    latest_survey = (
-        db.query(LSASSurvey)
-        .filter(LSASSurvey.patient_id == patient_id)
+@app.get("/patients/{patient_id}/latest-lsas", response_model=LSASScorePoint)
+@response_cache.cached("patient_id")
+async def get_latest_lsas(patient_id: int, db=Depends(get_read_db)):
+    result = await execute_read(
+        db,
+        select(
+            LSASSurvey.submission_date,
+            LSASSurvey.total_score,
+            LSASSurvey.anxiety_level,
+        )
+        .where(LSASSurvey.patient_id == patient_id)
         .order_by(LSASSurvey.submission_date.desc())
-        .first()
+        .limit(1),
     )
+    latest_survey = result.first()
 
     if not latest_survey:
         raise HTTPException(status_code=404, detail="No surveys found")
+    return latest_survey._asdict()
 
-    return {
-        "score": latest_survey.total_score,
-        "anxiety_level": latest_survey.anxiety_level,
-        "date": latest_survey.submission_date,
+
+# Doctor Dashboard Routes
+@app.get(
+    "/doctors/{doctor_id}/patient-surveys", response_model=List[PatientLatestSurvey]
+)
+@response_cache.cached("doctor_id")
+async def get_doctor_patient_surveys(
+    doctor_id: int,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    db=Depends(get_read_db),
+):
+    # Patients with their latest survey, newest first, in one query
+    result = await execute_read(
+        db, latest_surveys_for_doctor(doctor_id, skip=skip, limit=limit)
+    )
+    return [
+        {
+            "patient_id": row["id"],
+            "patient_name": row["name"],
+            "latest_survey": row if row["submission_date"] else None,
+        }
+        for row in rows_as_dicts(result.all())
+    ]
+
+
+@app.get("/doctors/{doctor_id}/cohort-analytics")
+async def get_doctor_cohort_analytics(
+    doctor_id: int,
+    min_change: int = Query(10, ge=1),  # LSAS points counted as a real change
+    db=Depends(get_read_db),
+):
+    result = await execute_read(db, select(Doctor.id).where(Doctor.id == doctor_id))
+    if result.first() is None:
+        raise HTTPException(status_code=404, detail="Doctor not found")
+
+    return await get_cohort_analytics(db, doctor_id, min_change)
+
+
+@app.get(
+    "/patients/{patient_id}/analytics",
+    response_model=PatientAnalytics,
+    response_model_exclude_unset=True,
+)
+@response_cache.cached("patient_id")
+async def get_patient_analytics(
+    patient_id: int,
+    include_history: bool = False,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    db=Depends(get_read_db),
+):
+    # Aggregates are maintained on every survey write, so this is one row
+    result = await execute_read(
+        db,
+        select(
+            PatientSurveyStats.survey_count,
+            PatientSurveyStats.score_sum,
+            PatientSurveyStats.min_score,
+            PatientSurveyStats.max_score,
+            PatientSurveyStats.last_anxiety_level,
+        ).where(PatientSurveyStats.patient_id == patient_id),
+    )
+    stats = result.first()
+
+    if not stats:
+        raise HTTPException(status_code=404, detail="No surveys found")
+
+    analytics = {
+        "total_surveys": stats.survey_count,
+        "average_score": stats.score_sum / stats.survey_count,
+        "highest_score": stats.max_score,
+        "lowest_score": stats.min_score,
+        "current_anxiety_level": stats.last_anxiety_level,
     }
 
+    if include_history:
+        # Paginated newest first, same cursor format as lsas-progress
+        surveys, next_cursor = await _survey_points_page(db, patient_id, cursor, limit)
+        analytics["score_history"] = rows_as_dicts(surveys)
+        analytics["next_cursor"] = next_cursor
 
-# Doctor Dashboard Routes
-@app.get("/doctors/{doctor_id}/patient-surveys")
-def get_doctor_patient_surveys(doctor_id: int, db: Session = Depends(get_db)):
-    # Get all patients for the doctor with their latest surveys
-    patients = db.query(Patient).filter(Patient.doctor_id == doctor_id).all()
-
-    patient_surveys = []
-    for patient in patients:
-        latest_survey = (
-            db.query(LSASSurvey)
-            .filter(LSASSurvey.patient_id == patient.id)
-            .order_by(LSASSurvey.submission_date.desc())
-            .first()
-        )
+    return analytics
 
-        patient_surveys.append(
-            {
-                "patient_id": patient.id,
-                "patient_name": patient.name,
-                "latest_survey": (
-                    {
-                        "score": latest_survey.total_score,
-                        "anxiety_level": latest_survey.anxiety_level,
-                        "date": latest_survey.submission_date,
-                    }
-                    if latest_survey
-                    else None
-                ),
-            }
+
+# Exercise Routes
+def _assign_exercises(db: Session, doctor_id: int, content: str, patient_ids):
+    doctor = db.query(Doctor.id).filter(Doctor.id == doctor_id).first()
+    if not doctor:
+        raise HTTPException(status_code=404, detail="Doctor not found")
+
+    patient_ids = list(dict.fromkeys(patient_ids))
+    own = set(
+        db.scalars(
+            select(Patient.id).where(
+                Patient.doctor_id == doctor_id, Patient.id.in_(patient_ids)
+            )
+        )
+    )
+    missing = [patient_id for patient_id in patient_ids if patient_id not in own]
+    if missing:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Patients not found for this doctor: {missing}",
         )
 
-    # Sort by latest survey date
-    return sorted(
-        patient_surveys,
-        key=lambda x: (
-            x["latest_survey"]["date"] if x["latest_survey"] else datetime.min
+    # One executemany insert for every patient, all with the same date;
+    # RETURNING sorted so the ids line up with the rows
+    assigned_date = datetime.utcnow()
+    rows = [
+        {
+            "patient_id": patient_id,
+            "assigned_date": assigned_date,
+            "content": content,
+            "completed": False,
+        }
+        for patient_id in patient_ids
+    ]
+    exercise_ids = db.scalars(
+        insert(AssignedExercise).returning(
+            AssignedExercise.id, sort_by_parameter_order=True
         ),
-        reverse=True,
+        rows,
+    ).all()
+    db.commit()
+
+    for row, exercise_id in zip(rows, exercise_ids):
+        row["id"] = exercise_id
+    return rows
+
+
+@app.post("/doctors/{doctor_id}/exercises", response_model=ExerciseResponse)
+def assign_exercise(
+    doctor_id: int, exercise: ExerciseAssign, db: Session = Depends(get_db)
+):
+    return _assign_exercises(db, doctor_id, exercise.content, [exercise.patient_id])[0]
+
+
+@app.post(
+    "/doctors/{doctor_id}/exercises/bulk", response_model=List[ExerciseResponse]
+)
+def assign_exercise_bulk(
+    doctor_id: int, exercise: ExerciseBulkAssign, db: Session = Depends(get_db)
+):
+    return _assign_exercises(db, doctor_id, exercise.content, exercise.patient_ids)
+
+
+@app.post(
+    "/patients/{patient_id}/exercises/{exercise_id}/complete",
+    response_model=ExerciseResponse,
+)
+def complete_exercise(patient_id: int, exercise_id: int, db: Session = Depends(get_db)):
+    exercise = (
+        db.query(AssignedExercise)
+        .filter(
+            AssignedExercise.id == exercise_id,
+            AssignedExercise.patient_id == patient_id,
+        )
+        .first()
     )
+    if not exercise:
+        raise HTTPException(status_code=404, detail="Exercise not found")
+
+    # Completing twice keeps the first completion date
+    if not exercise.completed:
+        exercise.completed = True
+        exercise.completion_date = datetime.utcnow()
+        db.commit()
+        db.refresh(exercise)
+    return exercise
+
 
+def _encode_exercise_cursor(row) -> str:
+    return f"{row.id}:{row.assigned_date.isoformat()}"
 
-@app.get("/patients/{patient_id}/analytics")
-def get_patient_analytics(patient_id: int, db: Session = Depends(get_db)):
-    surveys = (
-        db.query(LSASSurvey)
-        .filter(LSASSurvey.patient_id == patient_id)
-        .order_by(LSASSurvey.submission_date)
-        .all()
+
+@app.get("/patients/{patient_id}/exercises", response_model=ExerciseFeed)
+async def get_patient_exercises(
+    patient_id: int,
+    completed: bool = False,
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500),
+    db=Depends(get_read_db),
+):
+    # Homework feed: pending (or completed) exercises, newest first. The
+    # cursor has the same "id:date" format as lsas-progress
+    before_date, before_id = (
+        _decode_progress_cursor(cursor) if cursor else (None, None)
+    )
+    result = await execute_read(
+        db,
+        exercise_feed_page(
+            patient_id,
+            completed,
+            limit + 1,
+            before_date=before_date,
+            before_id=before_id,
+        ),
+    )
+    exercises = result.all()
+    next_cursor = (
+        _encode_exercise_cursor(exercises[limit - 1])
+        if len(exercises) > limit
+        else None
     )
 
-    if not surveys:
-        raise HTTPException(status_code=404, detail="No surveys found")
+    return {
+        "completed": completed,
+        "exercises": rows_as_dicts(exercises[:limit]),
+        "next_cursor": next_cursor,
+    }
+
+
+@app.get(
+    "/doctors/{doctor_id}/exercise-completion",
+    response_model=DoctorExerciseCompletion,
+)
+async def get_doctor_exercise_completion(
+    doctor_id: int, since: Optional[datetime] = None, db=Depends(get_read_db)
+):
+    result = await execute_read(db, select(Doctor.id).where(Doctor.id == doctor_id))
+    if result.first() is None:
+        raise HTTPException(status_code=404, detail="Doctor not found")
+
+    # Counted per patient in SQL; the totals add up those few rows
+    result = await execute_read(db, exercise_completion_by_patient(doctor_id, since))
+    patients = rows_as_dicts(result.all())
+    assigned = sum(patient["assigned"] for patient in patients)
+    completed = sum(patient["completed"] for patient in patients)
 
-    # Calculate analytics
-    scores = [survey.total_score for survey in surveys]
     return {
-        "total_surveys": len(surveys),
-        "average_score": sum(scores) / len(scores),
-        "highest_score": max(scores),
-        "lowest_score": min(scores),
-        "current_anxiety_level": surveys[-1].anxiety_level,
-        "score_history": [
-            {
-                "date": survey.submission_date,
-                "score": survey.total_score,
-                "anxiety_level": survey.anxiety_level,
-            }
-            for survey in surveys
-        ],
+        "doctor_id": doctor_id,
+        "since": since,
+        "assigned": assigned,
+        "completed": completed,
+        "completion_rate": completed / assigned if assigned else None,
+        "patients": patients,
     }
 
 
-@app.get("/api/lsas/questions", response_model=LSASQuestions)
-async def get_lsas_questions():
-    questions_data = [
-        {"id": 1, "situation": "Using a telephone in public"},
-        {"id": 2, "situation": "Participating in a small group activity"},
-        {"id": 3, "situation": "Eating in public"},
-        {"id": 4, "situation": "Drinking with others"},
-        {"id": 5, "situation": "Talking to someone in authority"},
-        {
-            "id": 6,
-            "situation": "Acting, performing, or speaking in front of an audience",
-        },
-        {"id": 7, "situation": "Going to a party"},
-        {"id": 8, "situation": "Working while being observed"},
-        {"id": 9, "situation": "Writing while being observed"},
-        {"id": 10, "situation": "Calling someone you don't know very well"},
-        {
-            "id": 11,
-            "situation": "Talking face to face with someone you don't know very well",
-        },
-        {"id": 12, "situation": "Meeting strangers"},
-        {"id": 13, "situation": "Urinating in a public bathroom"},
-        {"id": 14, "situation": "Entering a room when others are already seated"},
-        {"id": 15, "situation": "Being the center of attention"},
-        {"id": 16, "situation": "Speaking up at a meeting"},
-        {"id": 17, "situation": "Taking a test of your ability, skill, or knowledge"},
-        {
-            "id": 18,
-            "situation": "Expressing disagreement or disapproval to someone you don't know very well",
-        },
-        {
-            "id": 19,
-            "situation": "Looking someone who you don't know very well straight in the eyes",
-        },
-        {"id": 20, "situation": "Giving a prepared oral talk to a group"},
-        {
-            "id": 21,
-            "situation": "Trying to make someone's acquaintance for the purpose of a romantic/sexual relationship",
-        },
-        {"id": 22, "situation": "Returning goods to a store for a refund"},
-        {"id": 23, "situation": "Giving a party"},
-        {"id": 24, "situation": "Resisting a high pressure sales person"},
-    ]
+# Recommendation Routes
+@app.post(
+    "/surveys/{survey_id}/recommendations",
+    response_model=RecommendationJobResponse,
+    status_code=202,
+)
+def request_recommendation(survey_id: int, db: Session = Depends(get_db)):
+    survey = db.query(LSASSurvey).filter(LSASSurvey.id == survey_id).first()
+    if not survey:
+        raise HTTPException(status_code=404, detail="Survey not found")
 
-    fear_options = [level.value for level in FearLevel]
-    avoidance_options = [level.value for level in AvoidanceLevel]
+    job = RecommendationJob(survey_id=survey_id)
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    recommendation_pool.enqueue(job.id)
+    return job
+
+
+def _batch_progress(batch, status_counts) -> dict:
+    counts = dict(status_counts)
+    return {
+        "id": batch.id,
+        "doctor_id": batch.doctor_id,
+        "total_jobs": batch.total_jobs,
+        "concurrency": batch.concurrency,
+        "created_at": batch.created_at,
+        **counts,
+        "finished": counts.get("done", 0) + counts.get("failed", 0)
+        >= batch.total_jobs,
+    }
+
+
+@app.post(
+    "/doctors/{doctor_id}/recommendation-batches",
+    response_model=RecommendationBatchProgress,
+    status_code=202,
+)
+def request_recommendation_batch(
+    doctor_id: int,
+    concurrency: int = Query(8, ge=1, le=64),
+    db: Session = Depends(get_db),
+):
+    doctor = db.query(Doctor).filter(Doctor.id == doctor_id).first()
+    if not doctor:
+        raise HTTPException(status_code=404, detail="Doctor not found")
+
+    # Fresh recommendations for every patient's latest survey
+    batch, job_ids = create_recommendation_batch(db, doctor_id, concurrency)
+    db.commit()
+    recommendation_pool.submit_batch(job_ids, concurrency)
+    return _batch_progress(batch, {"queued": len(job_ids)})
+
+
+@app.get(
+    "/recommendation-batches/{batch_id}", response_model=RecommendationBatchProgress
+)
+async def get_recommendation_batch(batch_id: int, db=Depends(get_read_db)):
+    result = await execute_read(
+        db, select(RecommendationBatch).where(RecommendationBatch.id == batch_id)
+    )
+    batch = result.scalars().first()
+    if not batch:
+        raise HTTPException(status_code=404, detail="Batch not found")
+
+    result = await execute_read(db, batch_progress_query(batch_id))
+    return _batch_progress(batch, result.all())
+
+
+@app.get("/recommendations/cache-stats")
+async def get_recommendation_cache_stats():
+    return {**llm_cache.snapshot(), **recommendation_pool.stats}
+
+
+@app.get("/response-cache/stats")
+def get_response_cache_stats():
+    # Sync: counting the SQLite backend's entries reads its file
+    return response_cache.snapshot()
+
+
+@app.get("/recommendation-jobs/{job_id}", response_model=RecommendationJobResponse)
+async def get_recommendation_job(job_id: int, db=Depends(get_read_db)):
+    result = await execute_read(
+        db,
+        select(RecommendationJob)
+        .options(selectinload(RecommendationJob.recommendation))
+        .where(RecommendationJob.id == job_id),
+    )
+    job = result.scalars().first()
+
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+def _sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
 
-    questions = [
-        Question(
-            id=q["id"],
-            situation=q["situation"],
-            fear_options=fear_options,
-            avoidance_options=avoidance_options,
+
+async def _recommendation_events(request: Request, survey):
+    chunks = []
+    try:
+        async with aclosing(recommendation_pool.stream_text(survey)) as stream:
+            async for chunk in stream:
+                # Stop generating as soon as the client goes away; the
+                # partial plan is not stored
+                if await request.is_disconnected():
+                    return
+                chunks.append(chunk)
+                yield _sse_event("chunk", {"text": chunk})
+    except Exception as exc:
+        # The response has already started, so report failures in-stream
+        logger.warning("Streaming recommendation for survey %s failed: %s", survey.id, exc)
+        yield _sse_event("error", {"detail": "Recommendation generation failed"})
+        return
+
+    recommendation = await recommendation_pool.save_recommendation(
+        survey.id, "".join(chunks)
+    )
+    yield _sse_event("done", {"recommendation_id": recommendation.id})
+
+
+@app.get("/surveys/{survey_id}/recommendations/stream")
+async def stream_survey_recommendation(
+    survey_id: int, request: Request, db=Depends(get_read_db)
+):
+    # Server-Sent Events: "chunk" events carry text as the model writes it,
+    # then "done" with the stored recommendation's id (or "error")
+    result = await execute_read(db, select(LSASSurvey).where(LSASSurvey.id == survey_id))
+    survey = result.scalars().first()
+    if not survey:
+        raise HTTPException(status_code=404, detail="Survey not found")
+
+    return StreamingResponse(
+        _recommendation_events(request, survey),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get(
+    "/surveys/{survey_id}/recommendations",
+    response_model=List[RecommendationResponse],
+)
+async def get_survey_recommendations(survey_id: int, db=Depends(get_read_db)):
+    result = await execute_read(
+        db,
+        select(Recommendation)
+        .where(Recommendation.survey_id == survey_id)
+        .order_by(Recommendation.created_at.desc()),
+    )
+    return result.scalars().all()
+
+
+@app.get("/exports/{dataset}")
+async def export_dataset(
+    dataset: str,
+    format: str = "csv",  # 'csv', 'ndjson', 'parquet'
+    doctor_id: Optional[int] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    after_id: Optional[int] = None,  # resume: the last id already received
+    chunk_size: int = Query(EXPORT_CHUNK_SIZE, ge=100, le=100_000),
+):
+    if dataset not in EXPORT_DATASETS:
+        raise HTTPException(status_code=404, detail="Unknown export")
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(
+            status_code=400, detail="format must be one of: csv, ndjson, parquet"
         )
-        for q in questions_data
-    ]
+    if format == "parquet" and not parquet_available():
+        raise HTTPException(status_code=501, detail="Parquet export is not available")
+
+    # Rows are in id order and streamed a chunk at a time from the
+    # threadpool, so memory stays flat however large the export
+    return StreamingResponse(
+        stream_export(
+            engine,
+            dataset,
+            format,
+            chunk_size=chunk_size,
+            doctor_id=doctor_id,
+            since=since,
+            until=until,
+            after_id=after_id,
+        ),
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{dataset}.{format}"'},
+    )
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    # Prometheus text exposition format
+    return PlainTextResponse(
+        render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
+# The questionnaire is static: serialize it once and let clients cache it
+LSAS_QUESTIONS_BODY = LSAS_QUESTIONS.model_dump_json().encode()
+LSAS_QUESTIONS_ETAG = f'"{hashlib.sha256(LSAS_QUESTIONS_BODY).hexdigest()[:32]}"'
+LSAS_QUESTIONS_HEADERS = {
+    "ETag": LSAS_QUESTIONS_ETAG,
+    "Cache-Control": "public, max-age=86400",
+}
+
+
+@app.get("/api/lsas/questions", response_model=LSASQuestions)
+async def get_lsas_questions(if_none_match: Optional[str] = Header(None)):
+    if if_none_match:
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        if "*" in tags or LSAS_QUESTIONS_ETAG in tags:
+            return Response(status_code=304, headers=LSAS_QUESTIONS_HEADERS)
 
-    return LSASQuestions(
-        questions=questions,
-        fear_scale={"0": "None", "1": "Mild", "2": "Moderate", "3": "Severe"},
-        avoidance_scale={
-            "0": "Never",
-            "1": "Occasionally",
-            "2": "Often",
-            "3": "Usually",
-        },
+    return Response(
+        content=LSAS_QUESTIONS_BODY,
+        media_type="application/json",
+        headers=LSAS_QUESTIONS_HEADERS,
     )
 
 
@@ -0,0 +1,194 @@
+"""Benchmark caseload recommendation batches against a fake LLM server.
+
+    python -m benchmarks.batch_recommendations --patients 200 --concurrency 1 8 32
+
+Runs from the apis directory on a throwaway SQLite database. The fake
+server (benchmarks.fake_llm_server) runs in-process through httpx's ASGI
+transport, or use --url to point at one started separately.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--patients", type=int, default=200)
+    parser.add_argument(
+        "--patterns",
+        type=int,
+        default=50,
+        help="distinct answer patterns, so some prompts are identical",
+    )
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--server-rate", type=float, default=20.0)
+    parser.add_argument(
+        "--client-rate",
+        type=float,
+        default=None,
+        help="client token bucket rate, defaults to the server rate; 0 disables",
+    )
+    parser.add_argument("--error-rate", type=float, default=0.02)
+    parser.add_argument("--url", help="use a running fake server instead")
+    parser.add_argument("--output", help="write results as JSON")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    workdir = tempfile.mkdtemp(prefix="lsas-bench-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{workdir}/bench.db"
+
+    # Engines are created on import, so these come after DATABASE_URL is set
+    import httpx
+    from sqlalchemy import delete, insert
+
+    from benchmarks.fake_llm_server import create_fake_llm_app
+    from database.database_creation import (
+        Doctor,
+        LLMCacheEntry,
+        LSASSurvey,
+        Patient,
+        Recommendation,
+        RecommendationBatch,
+        RecommendationJob,
+        create_schema,
+    )
+    from database.engine import engine
+    from database.lsas_responses import pack_responses
+    from database.utils import AsyncSessionLocal, SessionLocal
+    from llm import HTTPLLMBackend, ResilientLLMBackend, TokenBucket
+    from llm_cache import LLMResponseCache
+    from models.lsas import get_anxiety_level
+    from models.user import QuestionResponse
+    from recommendations import (
+        RecommendationWorkerPool,
+        batch_progress_query,
+        create_recommendation_batch,
+    )
+
+    rng = random.Random(0)
+    patterns = [
+        [
+            QuestionResponse(
+                question_id=q, fear_rating=rng.randint(0, 3), avoidance_rating=rng.randint(0, 3)
+            )
+            for q in range(1, 25)
+        ]
+        for _ in range(args.patterns)
+    ]
+
+    create_schema(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(Doctor), [{"id": 1, "username": "bench", "name": "Bench"}])
+        conn.execute(
+            insert(Patient),
+            [
+                {"id": i, "username": f"p{i}", "name": f"Patient {i}", "doctor_id": 1}
+                for i in range(1, args.patients + 1)
+            ],
+        )
+        surveys = []
+        for i in range(1, args.patients + 1):
+            responses = rng.choice(patterns)
+            score = sum(r.fear_rating + r.avoidance_rating for r in responses)
+            surveys.append(
+                {
+                    "patient_id": i,
+                    "total_score": score,
+                    "anxiety_level": get_anxiety_level(score).value,
+                    "packed_responses": pack_responses(responses),
+                }
+            )
+        conn.execute(insert(LSASSurvey), surveys)
+
+    client_rate = args.server_rate if args.client_rate is None else args.client_rate
+
+    async def run(concurrency):
+        with engine.begin() as conn:
+            for model in (RecommendationJob, RecommendationBatch, Recommendation, LLMCacheEntry):
+                conn.execute(delete(model))
+
+        fake_app = None
+        if args.url:
+            client = httpx.AsyncClient(timeout=60)
+            url = args.url
+        else:
+            fake_app = create_fake_llm_app(
+                latency=args.latency, rate=args.server_rate, error_rate=args.error_rate
+            )
+            client = httpx.AsyncClient(
+                transport=httpx.ASGITransport(app=fake_app), base_url="http://fake-llm"
+            )
+            url = "http://fake-llm/generate"
+
+        backend = ResilientLLMBackend(
+            HTTPLLMBackend(url, client=client),
+            rate_limiter=(
+                TokenBucket(client_rate, max(1, int(client_rate))) if client_rate else None
+            ),
+            max_retries=8,
+            base_delay=0.1,
+        )
+        pool = RecommendationWorkerPool(cache=LLMResponseCache())
+        pool.backend = backend
+
+        with SessionLocal() as db:
+            batch, job_ids = create_recommendation_batch(db, 1, concurrency)
+            db.commit()
+            batch_id = batch.id
+
+        async def report_progress():
+            while True:
+                await asyncio.sleep(1)
+                async with AsyncSessionLocal() as db:
+                    counts = dict((await db.execute(batch_progress_query(batch_id))).all())
+                print(
+                    f"  concurrency {concurrency}: "
+                    f"{counts.get('done', 0) + counts.get('failed', 0)}/{len(job_ids)}",
+                    flush=True,
+                )
+
+        reporter = asyncio.create_task(report_progress())
+        start = time.perf_counter()
+        await pool.run_batch(job_ids, concurrency)
+        elapsed = time.perf_counter() - start
+        reporter.cancel()
+
+        async with AsyncSessionLocal() as db:
+            counts = dict((await db.execute(batch_progress_query(batch_id))).all())
+        await client.aclose()
+
+        return {
+            "concurrency": concurrency,
+            "jobs": len(job_ids),
+            "seconds": round(elapsed, 3),
+            "jobs_per_second": round(len(job_ids) / elapsed, 2),
+            "done": counts.get("done", 0),
+            "failed": counts.get("failed", 0),
+            "llm_calls": backend.stats["calls"],
+            "retries": backend.stats["retries"],
+            "server_rate_limited": fake_app.state.stats["rate_limited"] if fake_app else None,
+            "deduplicated": pool.stats["deduplicated"],
+            "cache_hits": pool.stats["cache_hits"],
+        }
+
+    results = [asyncio.run(run(concurrency)) for concurrency in args.concurrency]
+
+    columns = list(results[0])
+    print(" ".join(f"{column:>18}" for column in columns))
+    for result in results:
+        print(" ".join(f"{str(result[column]):>18}" for column in columns))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,406 @@
+"""End-to-end latency benchmark of every route in app.py.
+
+    python -m benchmarks.endpoints --scale medium --concurrency 8 --output after.json
+    python -m benchmarks.endpoints --scale medium --compare before.json
+
+Runs from the apis directory. A synthetic clinic (benchmarks.synthetic) is
+seeded into a throwaway SQLite database and the app is driven in-process
+through httpx's ASGI transport, one endpoint at a time at the given
+concurrency. Reports p50/p95/p99 latency, throughput and SQL statements
+per request for each endpoint.
+"""
+import argparse
+import asyncio
+import contextvars
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+
+import numpy as np
+
+# SQL statements executed on behalf of the current request
+_query_counter = contextvars.ContextVar("query_counter", default=None)
+
+
+def _count_query(*args):
+    counter = _query_counter.get()
+    if counter is not None:
+        counter[0] += 1
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    # Named sizes from benchmarks.synthetic.SCALES, which can only be
+    # imported once DATABASE_URL is set
+    parser.add_argument("--scale", choices=("small", "medium", "large"), default="small")
+    parser.add_argument("--surveys", type=int, help="overrides --scale")
+    parser.add_argument("--patients-per-doctor", type=int, default=50)
+    parser.add_argument("--surveys-per-patient", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=200, help="per endpoint")
+    parser.add_argument("--only", nargs="+", help="endpoint names to run")
+    parser.add_argument("--database", help="reuse a seeded database file")
+    parser.add_argument("--output", help="write results as JSON")
+    parser.add_argument("--compare", help="JSON results to compare against")
+    return parser.parse_args()
+
+
+def _survey_body(rng, patient_id=None):
+    body = {
+        "responses": [
+            {
+                "question_id": question_id,
+                "fear_rating": int(rng.integers(0, 4)),
+                "avoidance_rating": int(rng.integers(0, 4)),
+            }
+            for question_id in range(1, 25)
+        ]
+    }
+    if patient_id is not None:
+        body["patient_id"] = patient_id
+    return body
+
+
+def build_scenarios(clinic: dict, ids: dict):
+    """Endpoint name -> (max requests or None, request factory).
+
+    A factory takes the request number and returns httpx request
+    arguments. Routes that start LLM work are capped so the benchmark
+    measures the route rather than the worker pool.
+    """
+    rng = np.random.default_rng(1)
+    doctors, patients = clinic["doctors"], clinic["patients"]
+
+    def doctor(i):
+        return i % doctors + 1
+
+    def patient(i):
+        return (i * 7919) % patients + 1
+
+    def assignee(i):
+        # Patients of ids["doctor_id"], who exercises can be assigned to
+        return ids["patient_ids"][i % len(ids["patient_ids"])]
+
+    def exercise(i):
+        return ids["exercises"][i % len(ids["exercises"])]
+
+    def bulk_body(i):
+        lines = (
+            json.dumps(_survey_body(rng, patient(i * 50 + n))) for n in range(50)
+        )
+        return "\n".join(lines).encode()
+
+    return {
+        "register_doctor": (None, lambda i: ("POST", "/doctors/register", {"json": {
+            "username": f"bench-doctor-{i}",
+            "email": f"bench-doctor-{i}@example.com",
+            "password": "secret",
+            "name": f"Bench Doctor {i}",
+            "specialization": "CBT",
+        }})),
+        "register_patient": (None, lambda i: ("POST", "/patients/register", {"json": {
+            "username": f"bench-patient-{i}",
+            "email": f"bench-patient-{i}@example.com",
+            "password": "secret",
+            "name": f"Bench Patient {i}",
+            "doctor_id": doctor(i),
+        }})),
+        "login_doctor": (None, lambda i: ("POST", "/doctors/login", {"json": ids["login"]})),
+        "login_patient": (None, lambda i: ("POST", "/patients/login", {"json": ids["login"]})),
+        "list_doctors": (None, lambda i: ("GET", "/doctors/", {})),
+        "lsas_questions": (None, lambda i: ("GET", "/api/lsas/questions", {})),
+        "submit_survey": (None, lambda i: (
+            "POST", f"/patients/{patient(i)}/lsas-survey", {"json": _survey_body(rng)}
+        )),
+        "bulk_import": (20, lambda i: (
+            "POST", "/lsas-surveys/bulk", {"content": bulk_body(i)}
+        )),
+        "lsas_progress": (None, lambda i: (
+            "GET", f"/patients/{patient(i)}/lsas-progress",
+            {"params": {"timeframe": ("week", "month", "year")[i % 3]}},
+        )),
+        "latest_lsas": (None, lambda i: ("GET", f"/patients/{patient(i)}/latest-lsas", {})),
+        "doctor_patient_surveys": (None, lambda i: (
+            "GET", f"/doctors/{doctor(i)}/patient-surveys", {}
+        )),
+        "cohort_analytics": (None, lambda i: (
+            "GET", f"/doctors/{doctor(i)}/cohort-analytics", {}
+        )),
+        "patient_analytics": (None, lambda i: (
+            "GET", f"/patients/{patient(i)}/analytics",
+            {"params": {"include_history": i % 2 == 0}},
+        )),
+        "assign_exercise": (None, lambda i: (
+            "POST", f"/doctors/{ids['doctor_id']}/exercises",
+            {"json": {"content": "Bench exercise", "patient_id": assignee(i)}},
+        )),
+        "assign_exercise_bulk": (50, lambda i: (
+            "POST", f"/doctors/{ids['doctor_id']}/exercises/bulk",
+            {"json": {"content": "Bench exercise", "patient_ids": ids["patient_ids"][:50]}},
+        )),
+        "complete_exercise": (None, lambda i: (
+            "POST", "/patients/{}/exercises/{}/complete".format(*exercise(i)), {}
+        )),
+        "patient_exercises": (None, lambda i: (
+            "GET", f"/patients/{assignee(i)}/exercises", {"params": {"completed": i % 2 == 1}}
+        )),
+        "exercise_completion": (None, lambda i: (
+            "GET", f"/doctors/{doctor(i)}/exercise-completion", {}
+        )),
+        "request_recommendation": (50, lambda i: (
+            "POST", f"/surveys/{ids['survey_id']}/recommendations", {}
+        )),
+        "request_recommendation_batch": (5, lambda i: (
+            "POST", f"/doctors/{doctor(i)}/recommendation-batches", {}
+        )),
+        "recommendation_batch": (None, lambda i: (
+            "GET", f"/recommendation-batches/{ids['batch_id']}", {}
+        )),
+        "recommendation_cache_stats": (None, lambda i: (
+            "GET", "/recommendations/cache-stats", {}
+        )),
+        "recommendation_job": (None, lambda i: (
+            "GET", f"/recommendation-jobs/{ids['job_id']}", {}
+        )),
+        "stream_recommendation": (50, lambda i: (
+            "GET", f"/surveys/{ids['survey_id']}/recommendations/stream", {}
+        )),
+        "survey_recommendations": (None, lambda i: (
+            "GET", f"/surveys/{ids['survey_id']}/recommendations", {}
+        )),
+        "export": (20, lambda i: (
+            "GET", f"/exports/{('surveys', 'recommendations', 'exercises')[i % 3]}",
+            {"params": {"doctor_id": doctor(i)}},
+        )),
+        "response_cache_stats": (None, lambda i: ("GET", "/response-cache/stats", {})),
+        "metrics": (None, lambda i: ("GET", "/metrics", {})),
+    }
+
+
+def uncovered_routes(app, scenarios: dict) -> list:
+    """Names of the app's API routes no scenario requests."""
+    from fastapi.routing import APIRoute
+    from starlette.routing import Match
+
+    routes = [route for route in app.routes if isinstance(route, APIRoute)]
+    covered = set()
+    for _, factory in scenarios.values():
+        method, url, _ = factory(0)
+        scope = {"type": "http", "method": method, "path": url}
+        for route in routes:
+            if route.matches(scope)[0] == Match.FULL:
+                covered.add(route.name)
+                break
+    return [route.name for route in routes if route.name not in covered]
+
+
+async def run_endpoint(client, factory, requests: int, concurrency: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, queries = [], []
+    errors = 0
+
+    async def one(i):
+        nonlocal errors
+        method, url, kwargs = factory(i)
+        async with semaphore:
+            counter = [0]
+            token = _query_counter.set(counter)
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, url, **kwargs)
+            finally:
+                latencies.append(time.perf_counter() - start)
+                _query_counter.reset(token)
+            queries.append(counter[0])
+            if response.status_code >= 400:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    elapsed = time.perf_counter() - start
+
+    latencies_ms = np.array(latencies) * 1000
+    p50, p95, p99 = np.percentile(latencies_ms, [50, 95, 99])
+    return {
+        "requests": requests,
+        "errors": errors,
+        "p50_ms": round(float(p50), 3),
+        "p95_ms": round(float(p95), 3),
+        "p99_ms": round(float(p99), 3),
+        "mean_ms": round(float(latencies_ms.mean()), 3),
+        "throughput_rps": round(requests / elapsed, 1),
+        "queries_per_request": round(float(np.mean(queries)), 2),
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(results: dict, baseline: dict = None):
+    header = f"{'endpoint':<30}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>10}{'queries':>9}{'errors':>8}"
+    if baseline:
+        header += f"{'p95 vs base':>13}"
+    print(header)
+    for name, row in results.items():
+        line = (
+            f"{name:<30}{row['p50_ms']:>10}{row['p95_ms']:>10}{row['p99_ms']:>10}"
+            f"{row['throughput_rps']:>10}{row['queries_per_request']:>9}{row['errors']:>8}"
+        )
+        base = (baseline or {}).get(name)
+        if base:
+            line += f"{row['p95_ms'] / base['p95_ms']:>12.2f}x"
+        print(line)
+
+
+def main():
+    args = parse_args()
+    database = args.database or os.path.join(
+        tempfile.mkdtemp(prefix="lsas-bench-"), "bench.db"
+    )
+    reuse = args.database is not None and os.path.exists(args.database)
+    os.environ["DATABASE_URL"] = f"sqlite:///{database}"
+    # Offline deterministic model, without the client-side rate limit
+    os.environ.setdefault("LLM_BACKEND", "stub")
+    os.environ.setdefault("LLM_RATE_LIMIT", "0")
+
+    # Engines are created on import, so these come after DATABASE_URL is set
+    import httpx
+    from sqlalchemy import event, func, insert, select
+
+    from app import app
+    from benchmarks.synthetic import SCALES, seed_clinic
+    from credentials import password_hasher
+    from database.database_creation import (
+        AssignedExercise,
+        Doctor,
+        LSASSurvey,
+        Patient,
+        create_schema,
+    )
+    from database.engine import async_engine, engine
+    from database.utils import SessionLocal
+    from recommendations import create_recommendation_batch, recommendation_pool
+
+    if reuse:
+        create_schema(engine)
+        with engine.connect() as conn:
+            clinic = {
+                "doctors": conn.scalar(select(func.count(Doctor.id))),
+                "patients": conn.scalar(select(func.count(Patient.id))),
+                "surveys": conn.scalar(select(func.count(LSASSurvey.id))),
+            }
+    else:
+        start = time.perf_counter()
+        clinic = seed_clinic(
+            engine,
+            args.surveys or SCALES[args.scale],
+            patients_per_doctor=args.patients_per_doctor,
+            surveys_per_patient=args.surveys_per_patient,
+        )
+        print(f"Seeded {clinic} in {time.perf_counter() - start:.1f}s")
+
+    # Fixtures for routes that read existing recommendation state
+    with SessionLocal() as db:
+        batch, job_ids = create_recommendation_batch(db, 1, concurrency=1)
+        db.commit()
+        ids = {
+            "batch_id": batch.id,
+            "job_id": job_ids[0],
+            "survey_id": db.scalar(select(func.max(LSASSurvey.id))),
+            "doctor_id": 1,
+            "patient_ids": db.scalars(
+                select(Patient.id).where(Patient.doctor_id == 1).order_by(Patient.id).limit(1000)
+            ).all(),
+            "login": {"username": "bench-login", "password": "secret"},
+        }
+
+        # A doctor and patient with a real password hash, and one exercise
+        # per patient of doctor 1 to complete
+        login_hash = password_hasher.hash_blocking(ids["login"]["password"])
+        for model, extra in (
+            (Doctor, {"specialization": "CBT"}),
+            (Patient, {"doctor_id": 1}),
+        ):
+            if db.scalar(select(model.id).where(model.username == "bench-login")) is None:
+                db.execute(insert(model), [{
+                    "username": "bench-login",
+                    "email": "bench-login@example.com",
+                    "name": "Bench Login",
+                    "hashed_password": login_hash,
+                    **extra,
+                }])
+        exercise_ids = db.scalars(
+            insert(AssignedExercise).returning(
+                AssignedExercise.id, sort_by_parameter_order=True
+            ),
+            [{"patient_id": patient_id, "content": "Bench exercise"}
+             for patient_id in ids["patient_ids"]],
+        ).all()
+        ids["exercises"] = list(zip(ids["patient_ids"], exercise_ids))
+        db.commit()
+
+    for bound in (engine, async_engine.sync_engine):
+        event.listen(bound, "before_cursor_execute", _count_query)
+
+    scenarios = build_scenarios(clinic, ids)
+    names = args.only or list(scenarios)
+    missing = uncovered_routes(app, scenarios)
+    if missing:
+        raise SystemExit(f"No benchmark scenario for routes: {', '.join(missing)}")
+
+    async def run_all():
+        results = {}
+        transport = httpx.ASGITransport(app=app)
+        async with app.router.lifespan_context(app):
+            async with httpx.AsyncClient(
+                transport=transport, base_url="http://bench"
+            ) as client:
+                for name in names:
+                    cap, factory = scenarios[name]
+                    requests = min(args.requests, cap or args.requests)
+                    results[name] = await run_endpoint(
+                        client, factory, requests, args.concurrency
+                    )
+                    print(f"  {name}: p95 {results[name]['p95_ms']} ms", flush=True)
+            # Let queued recommendation jobs finish; cancelled mid-query at
+            # shutdown, they can leave aiosqlite calls that never return
+            await recommendation_pool.join()
+        # Closed while the loop is still running, so aiosqlite's connection
+        # threads shut down cleanly
+        await async_engine.dispose()
+        return results
+
+    results = asyncio.run(run_all())
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["endpoints"]
+    print_results(results, baseline)
+
+    if args.output:
+        report = {
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "clinic": clinic,
+            "concurrency": args.concurrency,
+            "endpoints": results,
+        }
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
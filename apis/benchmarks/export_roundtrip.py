@@ -0,0 +1,97 @@
+"""Check that exports load back unchanged through database.loader.
+
+    python -m benchmarks.export_roundtrip --surveys 5000
+
+Runs from the apis directory. A synthetic clinic is seeded into a
+throwaway SQLite database, with every third survey stored without item
+answers as older surveys are. Surveys, recommendations and exercises are
+exported as CSV and as NDJSON, each set is loaded into a fresh database
+and the tables are compared row for row. Exits non-zero on any difference.
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from sqlalchemy import select, update
+
+from database.database_creation import AssignedExercise, LSASSurvey, Recommendation
+from database.engine import create_db_engine
+from database.exports import stream_export
+from database.loader import bulk_load, file_sources
+
+from benchmarks.synthetic import seed_clinic
+
+# Exported dataset -> model whose rows must survive the round trip
+DATASETS = {
+    "surveys": LSASSurvey,
+    "recommendations": Recommendation,
+    "exercises": AssignedExercise,
+}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--surveys", type=int, default=5000)
+    parser.add_argument("--formats", nargs="+", choices=("csv", "ndjson"), default=["csv", "ndjson"])
+    return parser.parse_args()
+
+
+def table_rows(engine, model):
+    with engine.connect() as conn:
+        return conn.execute(select(model.__table__).order_by(model.id)).all()
+
+
+def round_trip(source, workdir: str, fmt: str) -> list:
+    """Export every dataset as `fmt`, load it into a new database and return
+    the names of the tables that differ."""
+    directory = os.path.join(workdir, fmt)
+    os.makedirs(directory)
+    for name in DATASETS:
+        with open(os.path.join(directory, f"{name}.{fmt}"), "wb") as f:
+            for data in stream_export(source, name, fmt):
+                f.write(data)
+
+    target = create_db_engine(f"sqlite:///{os.path.join(workdir, f'{fmt}.db')}")
+    try:
+        bulk_load(target, file_sources(directory))
+        return [
+            name
+            for name, model in DATASETS.items()
+            if table_rows(source, model) != table_rows(target, model)
+        ]
+    finally:
+        target.dispose()
+
+
+def main():
+    args = parse_args()
+    workdir = tempfile.mkdtemp(prefix="lsas-roundtrip-")
+    source = create_db_engine(f"sqlite:///{os.path.join(workdir, 'source.db')}")
+    failed = False
+    try:
+        clinic = seed_clinic(source, args.surveys)
+        with source.begin() as conn:
+            conn.execute(
+                update(LSASSurvey).where(LSASSurvey.id % 3 == 0).values(packed_responses=None)
+            )
+        print(f"Seeded {clinic}")
+
+        for fmt in args.formats:
+            start = time.perf_counter()
+            different = round_trip(source, workdir, fmt)
+            status = f"differs: {', '.join(different)}" if different else "identical"
+            print(f"{fmt:>8}: {status} ({time.perf_counter() - start:.1f}s)")
+            failed = failed or bool(different)
+    finally:
+        source.dispose()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
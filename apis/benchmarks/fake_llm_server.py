@@ -0,0 +1,83 @@
+"""A fake LLM completion service for benchmarks.
+
+Speaks the HTTPLLMBackend protocol (POST /generate {"prompt"} -> {"text"}),
+sleeps `latency` seconds per request and answers 429 with Retry-After once
+clients exceed `rate` requests per second, like a provider quota would.
+
+Run standalone with: python -m benchmarks.fake_llm_server --port 8001
+"""
+import argparse
+import asyncio
+import hashlib
+import random
+import time
+
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+
+class GenerateRequest(BaseModel):
+    prompt: str
+
+
+def create_fake_llm_app(
+    latency: float = 0.2,
+    jitter: float = 0.05,
+    rate: float = 20.0,
+    burst: int = 20,
+    error_rate: float = 0.0,
+    seed: int = 0,
+) -> FastAPI:
+    app = FastAPI()
+    rng = random.Random(seed)
+    bucket = {"tokens": float(burst), "updated": time.monotonic()}
+    app.state.stats = {"requests": 0, "rate_limited": 0, "errors": 0, "completed": 0}
+
+    @app.post("/generate")
+    async def generate(request: GenerateRequest):
+        stats = app.state.stats
+        stats["requests"] += 1
+
+        now = time.monotonic()
+        bucket["tokens"] = min(burst, bucket["tokens"] + (now - bucket["updated"]) * rate)
+        bucket["updated"] = now
+        if bucket["tokens"] < 1:
+            stats["rate_limited"] += 1
+            retry_after = (1 - bucket["tokens"]) / rate
+            return JSONResponse(
+                {"error": "rate limited"},
+                status_code=429,
+                headers={"Retry-After": f"{retry_after:.3f}"},
+            )
+        bucket["tokens"] -= 1
+
+        await asyncio.sleep(max(0.0, latency + rng.uniform(-jitter, jitter)))
+        if rng.random() < error_rate:
+            stats["errors"] += 1
+            return JSONResponse({"error": "overloaded"}, status_code=503)
+
+        stats["completed"] += 1
+        digest = hashlib.sha256(request.prompt.encode()).hexdigest()[:12]
+        return {"text": f"Recommendation plan {digest}"}
+
+    return app
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--rate", type=float, default=20.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    uvicorn.run(
+        create_fake_llm_app(
+            latency=args.latency, rate=args.rate, error_rate=args.error_rate
+        ),
+        host="127.0.0.1",
+        port=args.port,
+    )
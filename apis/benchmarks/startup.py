@@ -0,0 +1,208 @@
+"""Cold start time of the API process.
+
+    python -m benchmarks.startup --repeat 10
+    python -m benchmarks.startup --importtime 15
+
+Runs from the apis directory. Every run is a fresh interpreter, as for a new
+uvicorn worker or an autoscaled instance: it imports app, runs the lifespan
+startup hooks and serves a first request in-process (httpx ASGITransport),
+against a small freshly seeded SQLite database. Runs are repeated with the
+schema created on startup (DB_CREATE_SCHEMA=1, the default) and with it
+checked only (DB_CREATE_SCHEMA=0, as after `python -m database.schema`).
+Exits non-zero when the median time to the first response, from process
+start, goes over --budget-ms (0 disables the gate). --importtime lists the
+modules that take longest to import.
+
+The default budget leaves about a third of headroom over the baseline
+measured on a single-CPU host with 1000 seeded surveys and 10 runs:
+
+    schema    import ms  startup ms  first_request ms  process ms (p50)
+    create       1006.4       108.6              68.1      1480.1
+    check         964.2        89.2              64.4      1367.6
+
+Re-measure and move it when the target hardware or dependencies change.
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# Median process start to first response, see the baseline above
+DEFAULT_BUDGET_MS = 2000
+
+# Timed in the child; the parent adds interpreter start-up around it
+_CHILD = """
+import time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+
+import asyncio
+import json
+
+import httpx
+
+
+async def main():
+    async with app.app.router.lifespan_context(app.app):
+        started = time.perf_counter()
+        transport = httpx.ASGITransport(app=app.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            response = await client.get("/patients/1/latest-lsas")
+            response.raise_for_status()
+        responded = time.perf_counter()
+    print(json.dumps({
+        "import_ms": (imported - start) * 1000,
+        "startup_ms": (started - imported) * 1000,
+        "first_request_ms": (responded - started) * 1000,
+    }))
+
+
+asyncio.run(main())
+"""
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=10, help="runs per mode")
+    parser.add_argument("--surveys", type=int, default=1000, help="seeded database size")
+    parser.add_argument(
+        "--budget-ms",
+        type=float,
+        default=DEFAULT_BUDGET_MS,
+        help="fail above this median time to first response, 0 to disable",
+    )
+    parser.add_argument(
+        "--importtime", type=int, metavar="N", help="also list the N slowest module imports"
+    )
+    parser.add_argument("--output", help="write results as JSON")
+    return parser.parse_args()
+
+
+def _env(database: str, create_schema: bool) -> dict:
+    return {
+        **os.environ,
+        "DATABASE_URL": f"sqlite:///{database}",
+        "DB_CREATE_SCHEMA": "1" if create_schema else "0",
+        "LLM_BACKEND": "stub",
+        "RESPONSE_CACHE_BACKEND": "memory",
+    }
+
+
+def seed(database: str, surveys: int):
+    # Run in a child process so this one never imports the app
+    subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "from benchmarks.synthetic import seed_clinic;"
+            "from database.engine import engine;"
+            f"seed_clinic(engine, {surveys})",
+        ],
+        env={**os.environ, "DATABASE_URL": f"sqlite:///{database}"},
+        check=True,
+    )
+
+
+def run_once(database: str, create_schema: bool) -> dict:
+    start = time.perf_counter()
+    output = subprocess.run(
+        [sys.executable, "-c", _CHILD],
+        env=_env(database, create_schema),
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    elapsed = (time.perf_counter() - start) * 1000
+    result = json.loads(output.strip().splitlines()[-1])
+    # Process start to first response, as a load balancer would see it
+    result["process_ms"] = elapsed
+    return result
+
+
+def slowest_imports(database: str, count: int):
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app"],
+        env=_env(database, create_schema=False),
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stderr
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, cumulative_us, name = line.removeprefix("import time:").split("|")
+        if self_us.strip().isdigit():
+            imports.append((int(cumulative_us), int(self_us), name.strip()))
+    # Cumulative time of top-level modules: what each dependency costs
+    top_level = {}
+    for cumulative_us, self_us, name in imports:
+        root = name.split(".")[0]
+        top_level[root] = max(top_level.get(root, 0), cumulative_us)
+    return sorted(top_level.items(), key=lambda item: -item[1])[:count], sorted(
+        imports, key=lambda item: -item[1]
+    )[:count]
+
+
+def main():
+    args = parse_args()
+    workdir = tempfile.mkdtemp(prefix="lsas-bench-")
+    database = os.path.join(workdir, "bench.db")
+
+    results = {}
+    try:
+        seed(database, args.surveys)
+        # Warm the OS file cache and bytecode caches before timing
+        run_once(database, create_schema=False)
+
+        keys = ["import_ms", "startup_ms", "first_request_ms", "process_ms"]
+        print(f"{'schema':>10}" + "".join(f"{key.removesuffix('_ms') + ' ms':>20}" for key in keys))
+        for create_schema in (True, False):
+            runs = [run_once(database, create_schema) for _ in range(args.repeat)]
+            mode = "create" if create_schema else "check"
+            results[mode] = {
+                key: {
+                    "p50": round(statistics.median(run[key] for run in runs), 1),
+                    "max": round(max(run[key] for run in runs), 1),
+                }
+                for key in keys
+            }
+            print(
+                f"{mode:>10}"
+                + "".join(
+                    f"{results[mode][key]['p50']:>12.1f} (max {results[mode][key]['max']:>5.0f})"
+                    for key in keys
+                ),
+                flush=True,
+            )
+
+        if args.importtime:
+            packages, modules = slowest_imports(database, args.importtime)
+            print("\nSlowest top-level imports (cumulative ms)")
+            for name, cumulative_us in packages:
+                print(f"{cumulative_us / 1000:>10.1f}  {name}")
+            print("\nSlowest modules (self ms)")
+            for _, self_us, name in modules:
+                print(f"{self_us / 1000:>10.1f}  {name}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"repeat": args.repeat, "modes": results}, f, indent=2)
+
+    if args.budget_ms:
+        worst = max(mode["process_ms"]["p50"] for mode in results.values())
+        if worst > args.budget_ms:
+            print(f"\nMedian time to first response {worst:.0f} ms is over the {args.budget_ms:.0f} ms budget")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
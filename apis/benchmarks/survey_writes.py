@@ -0,0 +1,217 @@
+"""Survey submission throughput with and without group commit.
+
+    python -m benchmarks.survey_writes --workers 1 4 16 --concurrency 64
+
+Runs from the apis directory and needs uvicorn (pip install uvicorn; the
+app itself does not depend on it). For every worker count,
+`uvicorn app:app --workers N` is started twice on a freshly seeded
+throwaway SQLite database, once per write path (SURVEY_GROUP_COMMIT=0/1),
+and hammered with POST /patients/{id}/lsas-survey over HTTP. Recommendation
+workers are disabled so only the survey writes are measured.
+
+The load generator runs on the same host, so on a machine with few cores
+the numbers are bound by CPU (HTTP and validation), not by commits, and
+the two write paths come out close; group commit pays off once the
+server has cores to spare and the commits queue on the write lock.
+"""
+import argparse
+import asyncio
+import importlib.util
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--requests", type=int, default=5000, help="per run")
+    parser.add_argument("--patients", type=int, default=1000)
+    parser.add_argument("--batch-rows", type=int, default=100)
+    parser.add_argument("--batch-delay-ms", type=float, default=5.0)
+    parser.add_argument("--output", help="write results as JSON")
+    return parser.parse_args()
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _survey_body(rng):
+    return {
+        "responses": [
+            {
+                "question_id": question_id,
+                "fear_rating": int(rng.integers(0, 4)),
+                "avoidance_rating": int(rng.integers(0, 4)),
+            }
+            for question_id in range(1, 25)
+        ]
+    }
+
+
+def seed(database: str, patients: int):
+    # Run in a child process so this one never imports the app's engines
+    subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "from benchmarks.synthetic import seed_clinic;"
+            "from database.engine import engine;"
+            f"seed_clinic(engine, {patients}, surveys_per_patient=1)",
+        ],
+        env={**os.environ, "DATABASE_URL": f"sqlite:///{database}"},
+        check=True,
+    )
+
+
+class Server:
+    def __init__(self, database: str, workers: int, group_commit: bool, args):
+        self.port = _free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        env = {
+            **os.environ,
+            "DATABASE_URL": f"sqlite:///{database}",
+            "SURVEY_GROUP_COMMIT": "1" if group_commit else "0",
+            "SURVEY_BATCH_MAX_ROWS": str(args.batch_rows),
+            "SURVEY_BATCH_MAX_DELAY_MS": str(args.batch_delay_ms),
+            "RECOMMENDATION_WORKERS": "0",
+            "LLM_BACKEND": "stub",
+        }
+        self.process = subprocess.Popen(
+            [
+                sys.executable,
+                "-m",
+                "uvicorn",
+                "app:app",
+                "--port",
+                str(self.port),
+                "--workers",
+                str(workers),
+                "--log-level",
+                "warning",
+                "--no-access-log",
+            ],
+            env=env,
+        )
+
+    async def wait_ready(self, client, timeout: float = 60.0):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError("uvicorn exited; is it installed?")
+            try:
+                response = await client.get(f"{self.url}/api/lsas/questions")
+                if response.status_code == 200:
+                    return
+            except Exception:
+                pass
+            await asyncio.sleep(0.2)
+        raise RuntimeError("server did not start")
+
+    def stop(self):
+        self.process.terminate()
+        self.process.wait(timeout=30)
+
+
+async def run_load(url: str, args) -> dict:
+    import httpx
+
+    rng = np.random.default_rng(0)
+    bodies = [_survey_body(rng) for _ in range(100)]
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies = []
+    errors = 0
+
+    limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=60) as client:
+
+        async def one(i):
+            nonlocal errors
+            patient_id = (i * 7919) % args.patients + 1
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.post(
+                    f"{url}/patients/{patient_id}/lsas-survey",
+                    json=bodies[i % len(bodies)],
+                )
+                latencies.append(time.perf_counter() - start)
+            if response.status_code != 200:
+                errors += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(args.requests)))
+        elapsed = time.perf_counter() - start
+
+    latencies_ms = np.array(latencies) * 1000
+    p50, p95, p99 = np.percentile(latencies_ms, [50, 95, 99])
+    return {
+        "requests": args.requests,
+        "errors": errors,
+        "throughput_rps": round(args.requests / elapsed, 1),
+        "p50_ms": round(float(p50), 2),
+        "p95_ms": round(float(p95), 2),
+        "p99_ms": round(float(p99), 2),
+    }
+
+
+async def run_one(seeded: str, workers: int, group_commit: bool, args) -> dict:
+    import httpx
+
+    # Every run starts from the same freshly seeded database
+    workdir = tempfile.mkdtemp(prefix="lsas-bench-")
+    database = os.path.join(workdir, "bench.db")
+    shutil.copy(seeded, database)
+
+    server = Server(database, workers, group_commit, args)
+    try:
+        async with httpx.AsyncClient(timeout=5) as client:
+            await server.wait_ready(client)
+        return await run_load(server.url, args)
+    finally:
+        server.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    args = parse_args()
+    if importlib.util.find_spec("uvicorn") is None:
+        sys.exit("benchmarks.survey_writes needs uvicorn: pip install uvicorn")
+    seeddir = tempfile.mkdtemp(prefix="lsas-bench-")
+    seeded = os.path.join(seeddir, "seed.db")
+    seed(seeded, args.patients)
+
+    results = []
+    print(f"{'workers':>8}{'group commit':>14}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    try:
+        for workers in args.workers:
+            for group_commit in (False, True):
+                row = asyncio.run(run_one(seeded, workers, group_commit, args))
+                row.update(workers=workers, group_commit=group_commit)
+                results.append(row)
+                print(
+                    f"{workers:>8}{'on' if group_commit else 'off':>14}"
+                    f"{row['throughput_rps']:>10}{row['p50_ms']:>10}{row['p95_ms']:>10}"
+                    f"{row['p99_ms']:>10}{row['errors']:>8}",
+                    flush=True,
+                )
+    finally:
+        shutil.rmtree(seeddir, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"concurrency": args.concurrency, "runs": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
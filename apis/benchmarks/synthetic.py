@@ -0,0 +1,159 @@
+"""Synthetic clinic data: doctors, patients and weekly LSAS histories.
+
+Every patient gets a baseline severity and a drift, so cohorts contain
+improving, worsening and stable patients. Ratings are drawn per item and
+stored packed, exactly as submitted surveys are.
+"""
+import math
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from database.loader import bulk_load
+from database.lsas_responses import LSAS_ITEM_COUNT, PACKED_RESPONSES_SIZE, pack_ratings
+from models.lsas import ANXIETY_LEVEL_THRESHOLDS, AnxietyLevel
+
+# Total number of surveys generated per named scale
+SCALES = {"small": 100, "medium": 10_000, "large": 1_000_000}
+
+_LEVELS = [level.value for level in AnxietyLevel]
+
+
+def synthetic_doctors(doctors: int):
+    for doctor_id in range(1, doctors + 1):
+        yield {
+            "id": doctor_id,
+            "username": f"doctor{doctor_id}",
+            "email": f"doctor{doctor_id}@example.com",
+            "hashed_password": "synthetic",
+            "name": f"Doctor {doctor_id}",
+            "specialization": "CBT",
+        }
+
+
+def synthetic_patients(patients: int, patients_per_doctor: int):
+    for patient_id in range(1, patients + 1):
+        yield {
+            "id": patient_id,
+            "username": f"patient{patient_id}",
+            "email": f"patient{patient_id}@example.com",
+            "hashed_password": "synthetic",
+            "name": f"Patient {patient_id}",
+            "doctor_id": (patient_id - 1) // patients_per_doctor + 1,
+        }
+
+
+def synthetic_surveys(rng, patient_ids, surveys_per_patient: int, end: datetime):
+    """Yield survey rows for `patient_ids`, `surveys_per_patient` each.
+
+    Surveys are a week apart and end at `end`. Survey ids assume patient
+    ids start at 1 and every patient has the same number of surveys.
+    """
+    patient_ids = np.asarray(patient_ids)
+    n = len(patient_ids) * surveys_per_patient
+
+    # Probability that any single rating is high, drifting over time
+    baseline = rng.uniform(0.15, 0.85, len(patient_ids))
+    drift = rng.normal(0.0, 0.02, len(patient_ids))
+    week = np.tile(np.arange(surveys_per_patient), len(patient_ids))
+    severity = np.clip(
+        np.repeat(baseline, surveys_per_patient)
+        + np.repeat(drift, surveys_per_patient) * week,
+        0.0,
+        1.0,
+    )
+    ratings = rng.binomial(3, severity[:, np.newaxis], (n, LSAS_ITEM_COUNT * 2))
+    ratings = ratings.astype(np.uint8)
+
+    raw = pack_ratings(ratings)
+    totals = ratings.sum(axis=1, dtype=np.int32)
+    levels = np.searchsorted(ANXIETY_LEVEL_THRESHOLDS, totals, side="right")
+    dates = [
+        end - timedelta(weeks=surveys_per_patient - 1 - weeks)
+        for weeks in range(surveys_per_patient)
+    ]
+    first_id = (int(patient_ids[0]) - 1) * surveys_per_patient + 1 if n else 1
+
+    for index, (patient_id, total, level, weeks) in enumerate(
+        zip(
+            np.repeat(patient_ids, surveys_per_patient).tolist(),
+            totals.tolist(),
+            levels.tolist(),
+            week.tolist(),
+        )
+    ):
+        offset = index * PACKED_RESPONSES_SIZE
+        yield {
+            "id": first_id + index,
+            "patient_id": patient_id,
+            "submission_date": dates[weeks],
+            "total_score": total,
+            "anxiety_level": _LEVELS[level],
+            "packed_responses": raw[offset : offset + PACKED_RESPONSES_SIZE],
+        }
+
+
+def _surveys_in_chunks(rng, patients, surveys_per_patient, end, chunk_size=50_000):
+    # Generated a chunk of patients at a time to bound memory
+    patients_per_chunk = max(1, chunk_size // surveys_per_patient)
+    for first in range(1, patients + 1, patients_per_chunk):
+        last = min(patients, first + patients_per_chunk - 1)
+        yield from synthetic_surveys(
+            rng, range(first, last + 1), surveys_per_patient, end
+        )
+
+
+def synthetic_recommendations(patients: int, surveys_per_patient: int, end: datetime):
+    # One stored plan per patient, for their latest survey
+    for patient_id in range(1, patients + 1):
+        yield {
+            "survey_id": patient_id * surveys_per_patient,
+            "content": f"Synthetic recommendation plan for patient {patient_id}",
+            "created_at": end,
+            "selected": patient_id % 2 == 0,
+        }
+
+
+def synthetic_exercises(rng, patients: int, end: datetime, per_patient: int = 3):
+    completed = rng.random(patients * per_patient) < 0.6
+    for index, done in enumerate(completed.tolist()):
+        assigned = end - timedelta(days=7 * (index % per_patient + 1))
+        yield {
+            "patient_id": index // per_patient + 1,
+            "assigned_date": assigned,
+            "content": f"Exercise {index % per_patient + 1}",
+            "completed": done,
+            "completion_date": assigned + timedelta(days=2) if done else None,
+        }
+
+
+def synthetic_clinic(
+    surveys: int,
+    patients_per_doctor: int = 50,
+    surveys_per_patient: int = 10,
+    seed: int = 0,
+) -> dict:
+    """Row generators for database.loader.bulk_load, about `surveys` surveys.
+
+    Ids start at 1, so load into an empty database.
+    """
+    rng = np.random.default_rng(seed)
+    patients = max(1, math.ceil(surveys / surveys_per_patient))
+    doctors = max(1, math.ceil(patients / patients_per_doctor))
+    end = datetime.utcnow().replace(microsecond=0)
+
+    return {
+        "doctors": synthetic_doctors(doctors),
+        "patients": synthetic_patients(patients, patients_per_doctor),
+        "surveys": _surveys_in_chunks(rng, patients, surveys_per_patient, end),
+        "recommendations": synthetic_recommendations(patients, surveys_per_patient, end),
+        "exercises": synthetic_exercises(rng, patients, end),
+    }
+
+
+def seed_clinic(engine, surveys: int, **options) -> dict:
+    """Bulk-load a synthetic clinic into an empty database; returns row counts.
+
+    `options` are passed to synthetic_clinic.
+    """
+    return bulk_load(engine, synthetic_clinic(surveys, **options))
@@ -0,0 +1,203 @@
+import asyncio
+from collections import OrderedDict
+
+import numpy as np
+from sqlalchemy import func, select, union_all
+
+from database.database_creation import (
+    LSASMonthlySummary,
+    LSASSurvey,
+    Patient,
+    PatientSurveyStats,
+)
+from database.queries import execute_read, fetch_raw_rows
+from models.lsas import ANXIETY_LEVEL_THRESHOLDS, AnxietyLevel
+
+# Results are cached per (doctor, min_change) and reused for as long as the
+# doctor's fingerprint (patient count, survey count, newest survey, surveys
+# folded into monthly summaries) is unchanged, so a survey written by any
+# worker, or a retention run, invalidates them
+COHORT_CACHE_SIZE = 128
+_cache = OrderedDict()
+
+
+def cohort_fingerprint_query(doctor_id: int):
+    # Reads the maintained per-patient stats, not lsas_surveys. Retention
+    # leaves those unchanged, so the surveys summarised so far are counted
+    # too; the cohort's points change when surveys are folded into months
+    summarised = (
+        select(func.coalesce(func.sum(LSASMonthlySummary.survey_count), 0))
+        .join(Patient, Patient.id == LSASMonthlySummary.patient_id)
+        .where(Patient.doctor_id == doctor_id)
+        .scalar_subquery()
+    )
+    return (
+        select(
+            func.count(Patient.id),
+            func.coalesce(func.sum(PatientSurveyStats.survey_count), 0),
+            func.max(PatientSurveyStats.last_date),
+            summarised,
+        )
+        .select_from(Patient)
+        .outerjoin(PatientSurveyStats, PatientSurveyStats.patient_id == Patient.id)
+        .where(Patient.doctor_id == doctor_id)
+    )
+
+
+def cohort_surveys_query(doctor_id: int):
+    # Only the three columns the computation needs, with dates as day numbers.
+    # Archived months count as one point each, at their first survey with
+    # the month's mean score.
+    merged = union_all(
+        select(
+            LSASSurvey.patient_id,
+            func.julianday(LSASSurvey.submission_date).label("day"),
+            LSASSurvey.total_score.label("score"),
+        )
+        .join(Patient, Patient.id == LSASSurvey.patient_id)
+        .where(Patient.doctor_id == doctor_id),
+        select(
+            LSASMonthlySummary.patient_id,
+            func.julianday(LSASMonthlySummary.first_date),
+            func.round(LSASMonthlySummary.score_sum * 1.0 / LSASMonthlySummary.survey_count),
+        )
+        .join(Patient, Patient.id == LSASMonthlySummary.patient_id)
+        .where(Patient.doctor_id == doctor_id),
+    ).subquery()
+    return select(merged).order_by(merged.c.patient_id, merged.c.day)
+
+
+def _nullable(value):
+    return None if np.isnan(value) else float(value)
+
+
+def compute_cohort_analytics(rows, patient_count: int, min_change: int) -> dict:
+    """Summarise a caseload from (patient_id, julian_day, score) rows.
+
+    Rows must be ordered by patient, then date. A patient has improved
+    (worsened) when their latest score is at least `min_change` points
+    below (above) their first one.
+    """
+    levels = list(AnxietyLevel)
+    if not rows:
+        return {
+            "patient_count": patient_count,
+            "patients_with_surveys": 0,
+            "survey_count": 0,
+            "anxiety_level_distribution": {level.value: 0 for level in levels},
+            "improved": 0,
+            "worsened": 0,
+            "stable": 0,
+            "insufficient_data": 0,
+            "mean_slope_per_week": None,
+            "time_to_improvement_days": {"patients": 0, "mean": None, "median": None},
+            "patients": [],
+        }
+
+    # fromiter over the flattened rows avoids per-row array conversion
+    columns = np.fromiter(
+        (value for row in rows for value in row), np.float64, count=3 * len(rows)
+    ).reshape(len(rows), 3)
+    patient_ids = columns[:, 0].astype(np.int64)
+    days = columns[:, 1]
+    scores = columns[:, 2]
+
+    # Group boundaries of the patient-sorted rows
+    starts = np.flatnonzero(np.r_[True, patient_ids[1:] != patient_ids[:-1]])
+    counts = np.diff(np.r_[starts, len(patient_ids)])
+    group = np.repeat(np.arange(len(starts)), counts)
+    first_score = scores[starts]
+    latest_score = scores[starts + counts - 1]
+
+    # Least-squares slope per patient, with time in weeks since their first
+    # survey so the sums stay well conditioned
+    elapsed_days = days - days[starts][group]
+    weeks = elapsed_days / 7
+    sum_x = np.bincount(group, weeks)
+    sum_y = np.bincount(group, scores)
+    sum_xx = np.bincount(group, weeks * weeks)
+    sum_xy = np.bincount(group, weeks * scores)
+    denominator = counts * sum_xx - sum_x**2
+    has_trend = denominator > 1e-9
+    slope = np.full(len(starts), np.nan)
+    slope[has_trend] = (
+        counts[has_trend] * sum_xy[has_trend] - sum_x[has_trend] * sum_y[has_trend]
+    ) / denominator[has_trend]
+
+    change = latest_score - first_score
+    multiple = counts > 1
+    improved = multiple & (change <= -min_change)
+    worsened = multiple & (change >= min_change)
+
+    # First survey at which each patient reached the improvement target
+    reached = scores <= first_score[group] - min_change
+    reached_groups, first_reached = np.unique(group[reached], return_index=True)
+    days_to_improvement = np.full(len(starts), np.nan)
+    days_to_improvement[reached_groups] = elapsed_days[reached][first_reached]
+
+    level_index = np.searchsorted(ANXIETY_LEVEL_THRESHOLDS, latest_score, side="right")
+    level_counts = np.bincount(level_index, minlength=len(levels))
+
+    reached_days = days_to_improvement[reached_groups]
+    return {
+        "patient_count": patient_count,
+        "patients_with_surveys": int(len(starts)),
+        "survey_count": int(len(scores)),
+        "anxiety_level_distribution": {
+            level.value: int(count) for level, count in zip(levels, level_counts)
+        },
+        "improved": int(improved.sum()),
+        "worsened": int(worsened.sum()),
+        "stable": int((multiple & ~improved & ~worsened).sum()),
+        "insufficient_data": int((~multiple).sum()),
+        "mean_slope_per_week": (
+            float(slope[has_trend].mean()) if has_trend.any() else None
+        ),
+        "time_to_improvement_days": {
+            "patients": int(len(reached_groups)),
+            "mean": float(reached_days.mean()) if len(reached_days) else None,
+            "median": float(np.median(reached_days)) if len(reached_days) else None,
+        },
+        "patients": [
+            {
+                "patient_id": int(patient_id),
+                "survey_count": int(count),
+                "first_score": int(first),
+                "latest_score": int(latest),
+                "slope_per_week": _nullable(patient_slope),
+                "days_to_improvement": _nullable(days),
+            }
+            for patient_id, count, first, latest, patient_slope, days in zip(
+                patient_ids[starts],
+                counts,
+                first_score,
+                latest_score,
+                slope,
+                days_to_improvement,
+            )
+        ],
+    }
+
+
+async def get_cohort_analytics(db, doctor_id: int, min_change: int) -> dict:
+    result = await execute_read(db, cohort_fingerprint_query(doctor_id))
+    fingerprint = tuple(result.one())
+
+    key = (doctor_id, min_change)
+    cached = _cache.get(key)
+    if cached is not None and cached[0] == fingerprint:
+        _cache.move_to_end(key)
+        return cached[1]
+
+    rows = await fetch_raw_rows(db, cohort_surveys_query(doctor_id))
+    # NumPy work runs off the event loop
+    analytics = await asyncio.to_thread(
+        compute_cohort_analytics, rows, fingerprint[0], min_change
+    )
+    analytics = {"doctor_id": doctor_id, **analytics}
+
+    _cache[key] = (fingerprint, analytics)
+    _cache.move_to_end(key)
+    while len(_cache) > COHORT_CACHE_SIZE:
+        _cache.popitem(last=False)
+    return analytics
@@ -0,0 +1,152 @@
+"""Password hashing on a bounded worker pool.
+
+Hashing is deliberately slow, so it never runs on the event loop: calls go
+to a small thread pool (hashlib releases the GIL while hashing) and, past
+PASSWORD_HASH_MAX_PENDING waiting calls, are refused with
+PasswordHasherBusy instead of queueing without bound.
+
+Hashes are scrypt, stored as "$scrypt$ln=14,r=8,p=1$<salt>$<hash>" so
+each one records its own cost. Hashes with other parameters, and the
+plaintext passwords stored before hashing existed, still verify and are
+reported by needs_rehash so login can upgrade them.
+"""
+import asyncio
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+from concurrent.futures import ThreadPoolExecutor
+
+# Cost: 2**LOG_N iterations using 128 * R * 2**LOG_N bytes (16 MiB by default)
+PASSWORD_HASH_LOG_N = int(os.getenv("PASSWORD_HASH_LOG_N", "14"))
+PASSWORD_HASH_R = int(os.getenv("PASSWORD_HASH_R", "8"))
+PASSWORD_HASH_P = int(os.getenv("PASSWORD_HASH_P", "1"))
+PASSWORD_HASH_WORKERS = int(
+    os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1)))
+)
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "64"))
+
+_PREFIX = "$scrypt$"
+_SALT_BYTES = 16
+_HASH_BYTES = 32
+
+
+class PasswordHasherBusy(Exception):
+    pass
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.b64encode(data).decode().rstrip("=")
+
+
+def _b64decode(text: str) -> bytes:
+    return base64.b64decode(text + "=" * (-len(text) % 4))
+
+
+def _scrypt(password: str, salt: bytes, log_n: int, r: int, p: int) -> bytes:
+    n = 2**log_n
+    return hashlib.scrypt(
+        password.encode(),
+        salt=salt,
+        n=n,
+        r=r,
+        p=p,
+        maxmem=256 * r * n,
+        dklen=_HASH_BYTES,
+    )
+
+
+def _parse(stored: str):
+    # -> (log_n, r, p, salt, digest), or None for a legacy plaintext value
+    if not stored.startswith(_PREFIX):
+        return None
+    try:
+        params, salt, digest = stored[len(_PREFIX) :].split("$")
+        values = dict(item.split("=") for item in params.split(","))
+        return (
+            int(values["ln"]),
+            int(values["r"]),
+            int(values["p"]),
+            _b64decode(salt),
+            _b64decode(digest),
+        )
+    except (ValueError, KeyError):
+        # A plaintext password that merely starts like a hash
+        return None
+
+
+class PasswordHasher:
+    def __init__(
+        self,
+        log_n: int = PASSWORD_HASH_LOG_N,
+        r: int = PASSWORD_HASH_R,
+        p: int = PASSWORD_HASH_P,
+        workers: int = PASSWORD_HASH_WORKERS,
+        max_pending: int = PASSWORD_HASH_MAX_PENDING,
+    ):
+        self.log_n = log_n
+        self.r = r
+        self.p = p
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor = None
+        self._pending = 0
+        self._dummy_hash = None
+
+    def hash_blocking(self, password: str) -> str:
+        salt = secrets.token_bytes(_SALT_BYTES)
+        digest = _scrypt(password, salt, self.log_n, self.r, self.p)
+        return (
+            f"{_PREFIX}ln={self.log_n},r={self.r},p={self.p}"
+            f"${_b64encode(salt)}${_b64encode(digest)}"
+        )
+
+    def verify_blocking(self, password: str, stored: str) -> bool:
+        parsed = _parse(stored)
+        if parsed is None:
+            # Stored before passwords were hashed
+            return hmac.compare_digest(password.encode(), stored.encode())
+        log_n, r, p, salt, digest = parsed
+        return hmac.compare_digest(_scrypt(password, salt, log_n, r, p), digest)
+
+    def needs_rehash(self, stored: str) -> bool:
+        parsed = _parse(stored)
+        return parsed is None or parsed[:3] != (self.log_n, self.r, self.p)
+
+    async def hash(self, password: str) -> str:
+        return await self._run(self.hash_blocking, password)
+
+    async def verify(self, password: str, stored: str = None) -> bool:
+        if stored is None:
+            # Unknown user: spend the same time as a real check, so response
+            # times don't reveal which usernames exist
+            if self._dummy_hash is None:
+                self._dummy_hash = await self.hash(secrets.token_urlsafe())
+            await self._run(self.verify_blocking, password, self._dummy_hash)
+            return False
+        return await self._run(self.verify_blocking, password, stored)
+
+    async def _run(self, func, *args):
+        if self._pending >= self.max_pending:
+            raise PasswordHasherBusy()
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                self.workers, thread_name_prefix="password-hash"
+            )
+
+        self._pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                self._executor, func, *args
+            )
+        finally:
+            self._pending -= 1
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+password_hasher = PasswordHasher()
@@ -1,2 +1,6 @@
+from .engine import *
 from .database_creation import *
 from .utils import *
+from .queries import *
+from .lsas_responses import *
+from .patient_stats import *
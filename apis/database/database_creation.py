@@ -1,5 +1,4 @@
 from sqlalchemy import (
-    create_engine,
     Column,
     Integer,
     String,
@@ -8,17 +7,22 @@ from sqlalchemy import (
     Boolean,
     Float,
     Enum,
+    Index,
+    LargeBinary,
+    inspect,
+    text,
 )
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session, relationship
 
+import os
 from datetime import datetime
 
+# The app creates/migrates the schema on startup unless this is 0, in which
+# case `python -m database.schema` has to be run before it starts
+DB_CREATE_SCHEMA = os.getenv("DB_CREATE_SCHEMA", "1") == "1"
+
 # Database setup
-SQLALCHEMY_DATABASE_URL = "sqlite:///./therapy_system.db"
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
 Base = declarative_base()
 
 
@@ -43,7 +47,7 @@ class Patient(Base):
     email = Column(String, unique=True, index=True)
     hashed_password = Column(String)
     name = Column(String)
-    doctor_id = Column(Integer, ForeignKey("doctors.id"))
+    doctor_id = Column(Integer, ForeignKey("doctors.id"), index=True)
     doctor = relationship("Doctor", back_populates="patients")
     surveys = relationship("LSASSurvey", back_populates="patient")
     exercises = relationship("AssignedExercise", back_populates="patient")
@@ -51,12 +55,18 @@ class Patient(Base):
 
 class LSASSurvey(Base):
     __tablename__ = "lsas_surveys"
+    __table_args__ = (
+        # Serves "latest survey per patient" and per-patient history scans
+        Index("ix_lsas_surveys_patient_date", "patient_id", "submission_date"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     patient_id = Column(Integer, ForeignKey("patients.id"))
     submission_date = Column(DateTime, default=datetime.utcnow)
     total_score = Column(Integer)
     anxiety_level = Column(String)
+    # 24 fear + 24 avoidance ratings, 2 bits each (see database.lsas_responses)
+    packed_responses = Column(LargeBinary(12), nullable=True)
     patient = relationship("Patient", back_populates="surveys")
     recommendations = relationship("Recommendation", back_populates="survey")
 
@@ -72,8 +82,93 @@ class Recommendation(Base):
     selected = Column(Boolean, default=False)
 
 
+class RecommendationBatch(Base):
+    # A doctor's request to regenerate recommendations for their caseload
+    __tablename__ = "recommendation_batches"
+
+    id = Column(Integer, primary_key=True, index=True)
+    doctor_id = Column(Integer, ForeignKey("doctors.id"), index=True)
+    total_jobs = Column(Integer)
+    concurrency = Column(Integer)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class RecommendationJob(Base):
+    # Queue of recommendation generations, processed by the worker pool in
+    # recommendations.py
+    __tablename__ = "recommendation_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    survey_id = Column(Integer, ForeignKey("lsas_surveys.id"), index=True)
+    batch_id = Column(
+        Integer, ForeignKey("recommendation_batches.id"), nullable=True, index=True
+    )
+    status = Column(String, default="queued", index=True)
+    error = Column(String, nullable=True)
+    recommendation_id = Column(
+        Integer, ForeignKey("recommendations.id"), nullable=True
+    )
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    survey = relationship("LSASSurvey")
+    recommendation = relationship("Recommendation")
+
+
+class LLMCacheEntry(Base):
+    # Persistent tier of the LLM response cache (see llm_cache.py)
+    __tablename__ = "llm_cache"
+
+    key = Column(String, primary_key=True)
+    model_name = Column(String)
+    content = Column(String)
+    size = Column(Integer)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+
+class PatientSurveyStats(Base):
+    # Running aggregates over a patient's surveys, kept up to date by every
+    # survey write (see database.patient_stats)
+    __tablename__ = "patient_survey_stats"
+
+    patient_id = Column(Integer, ForeignKey("patients.id"), primary_key=True)
+    survey_count = Column(Integer, nullable=False)
+    score_sum = Column(Integer, nullable=False)
+    min_score = Column(Integer, nullable=False)
+    max_score = Column(Integer, nullable=False)
+    first_date = Column(DateTime, nullable=False)
+    last_date = Column(DateTime, nullable=False)
+    last_anxiety_level = Column(String)
+
+
+class LSASMonthlySummary(Base):
+    # Per-patient monthly roll-up of surveys whose detail rows were moved to
+    # the archive database (see database.retention)
+    __tablename__ = "lsas_monthly_summaries"
+
+    patient_id = Column(Integer, ForeignKey("patients.id"), primary_key=True)
+    month = Column(DateTime, primary_key=True)  # first day of the month
+    survey_count = Column(Integer, nullable=False)
+    score_sum = Column(Integer, nullable=False)
+    min_score = Column(Integer, nullable=False)
+    max_score = Column(Integer, nullable=False)
+    first_date = Column(DateTime, nullable=False)
+    last_date = Column(DateTime, nullable=False)
+    last_anxiety_level = Column(String)
+
+
 class AssignedExercise(Base):
     __tablename__ = "assigned_exercises"
+    __table_args__ = (
+        # Serves the homework feed: one patient's pending or completed
+        # exercises, newest first
+        Index(
+            "ix_assigned_exercises_patient_completed_date",
+            "patient_id",
+            "completed",
+            "assigned_date",
+        ),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     patient_id = Column(Integer, ForeignKey("patients.id"))
@@ -84,5 +179,59 @@ class AssignedExercise(Base):
     patient = relationship("Patient", back_populates="exercises")
 
 
-# Create tables
-Base.metadata.create_all(bind=engine)
+def add_missing_columns(bind):
+    # create_all never alters existing tables, so columns added to a model
+    # later are appended here (they must be nullable)
+    with bind.begin() as conn:
+        # Inspected through the same connection, so one pooled connection
+        # is enough
+        inspector = inspect(conn)
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                column_type = column.type.compile(dialect=bind.dialect)
+                conn.execute(
+                    text(
+                        f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"
+                    )
+                )
+
+
+def create_missing_indexes(bind):
+    # create_all only emits indexes for tables it creates, so indexes added
+    # to existing tables have to be created separately
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=bind, checkfirst=True)
+
+
+def check_schema(bind):
+    # Startup check when the app doesn't create the schema itself
+    missing = set(Base.metadata.tables) - set(inspect(bind).get_table_names())
+    if missing:
+        raise RuntimeError(
+            f"Missing tables {', '.join(sorted(missing))}; run `python -m database.schema`"
+        )
+
+
+def create_schema(bind):
+    """Create missing tables, columns and indexes; safe to run repeatedly.
+
+    Run by `python -m database.schema`, and by the app on startup unless
+    DB_CREATE_SCHEMA=0.
+    """
+    stats_missing = not inspect(bind).has_table(PatientSurveyStats.__tablename__)
+    Base.metadata.create_all(bind=bind)
+    add_missing_columns(bind)
+    create_missing_indexes(bind)
+
+    # Backfill running aggregates the first time the stats table appears
+    if stats_missing:
+        from .patient_stats import rebuild_patient_stats
+
+        with bind.begin() as conn:
+            rebuild_patient_stats(conn)
@@ -0,0 +1,84 @@
+import os
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine
+
+# Every engine in the app is created here so all connections share the same
+# URL, pool settings and SQLite pragmas. Settings come from the environment.
+SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./therapy_system.db")
+
+SQLITE_JOURNAL_MODE = os.getenv("DB_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.getenv("DB_SYNCHRONOUS", "NORMAL")
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_MMAP_SIZE = int(os.getenv("DB_MMAP_SIZE", str(256 * 1024 * 1024)))
+# Negative values are KiB, so the default is a 64 MiB page cache per connection
+SQLITE_CACHE_SIZE = int(os.getenv("DB_CACHE_SIZE", "-65536"))
+
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+
+
+def _is_sqlite(url) -> bool:
+    return url.get_backend_name() == "sqlite"
+
+
+def _is_memory_sqlite(url) -> bool:
+    return _is_sqlite(url) and url.database in (None, "", ":memory:")
+
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute(f"PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.execute(f"PRAGMA journal_mode = {SQLITE_JOURNAL_MODE}")
+        cursor.execute(f"PRAGMA synchronous = {SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA mmap_size = {SQLITE_MMAP_SIZE}")
+        cursor.execute(f"PRAGMA cache_size = {SQLITE_CACHE_SIZE}")
+    finally:
+        cursor.close()
+
+
+def _engine_options(url) -> dict:
+    options = {}
+    if _is_sqlite(url):
+        options["connect_args"] = {"check_same_thread": False}
+    # In-memory SQLite uses a single shared connection, not a sized pool
+    if not _is_memory_sqlite(url):
+        options.update(
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+        )
+    return options
+
+
+def create_db_engine(url: str = None, **kwargs):
+    url = make_url(url or SQLALCHEMY_DATABASE_URL)
+    engine = create_engine(url, **{**_engine_options(url), **kwargs})
+    if _is_sqlite(url):
+        event.listen(engine, "connect", _apply_sqlite_pragmas)
+    return engine
+
+
+def async_database_url(url: str = None) -> str:
+    url = make_url(url or SQLALCHEMY_DATABASE_URL)
+    if url.drivername == "sqlite":
+        url = url.set(drivername="sqlite+aiosqlite")
+    return url.render_as_string(hide_password=False)
+
+
+def create_async_db_engine(url: str = None, **kwargs):
+    url = make_url(async_database_url(url))
+    options = _engine_options(url)
+    # aiosqlite runs each connection on its own thread already
+    options.pop("connect_args", None)
+    engine = create_async_engine(url, **{**options, **kwargs})
+    if _is_sqlite(url):
+        event.listen(engine.sync_engine, "connect", _apply_sqlite_pragmas)
+    return engine
+
+
+engine = create_db_engine()
+async_engine = create_async_db_engine()
@@ -0,0 +1,355 @@
+"""Streaming exports of surveys, recommendations and exercises.
+
+    python -m database.exports surveys --format parquet --doctor-id 3 -o surveys.parquet
+    python -m database.exports exercises --since 2025-01-01 --after-id 120000 -o rest.csv
+
+Run from the apis directory. Rows are read in id order with yield_per, so
+only one chunk is in memory at a time, and written as CSV, NDJSON or
+Parquet (one row group per chunk; needs pyarrow). An export is resumed by
+passing the last id it wrote as --after-id (or the after_id parameter of
+GET /exports/{dataset}); the CLI prints that id when it finishes.
+
+Survey exports carry the item ratings as fear_N/avoidance_N columns (blank
+for surveys stored without item answers), the format database.loader reads
+back; benchmarks.export_roundtrip checks that CSV and NDJSON exports load
+back unchanged.
+"""
+import argparse
+import csv
+import io
+import json
+import sys
+import time
+from datetime import date, datetime
+
+import numpy as np
+from sqlalchemy import select
+
+from .database_creation import AssignedExercise, LSASSurvey, Patient, Recommendation
+from .lsas_responses import LSAS_ITEM_COUNT, unpack_responses
+
+EXPORT_CHUNK_SIZE = 10_000
+EXPORT_FORMATS = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+_RATING_COLUMNS = [
+    name
+    for item in range(1, LSAS_ITEM_COUNT + 1)
+    for name in (f"fear_{item}", f"avoidance_{item}")
+]
+
+
+class ExportDataset:
+    """A table export: its columns, how to filter it and how to page it."""
+
+    def __init__(self, model, columns, date_column, patient_column, join=None):
+        self.model = model
+        self.columns = columns
+        self.date_column = date_column
+        self.patient_column = patient_column
+        # (model, onclause) needed to reach patient_id, if not on the table
+        self.join = join
+
+    @property
+    def names(self):
+        return [column.key for column in self.columns]
+
+    def query(self, doctor_id=None, since=None, until=None, after_id=None):
+        # Keyset order: resuming after an id needs no OFFSET scan
+        stmt = select(*self.columns)
+        if self.join is not None:
+            stmt = stmt.join(*self.join)
+        if doctor_id is not None:
+            stmt = stmt.join(Patient, Patient.id == self.patient_column).where(
+                Patient.doctor_id == doctor_id
+            )
+        if since is not None:
+            stmt = stmt.where(self.date_column >= since)
+        if until is not None:
+            stmt = stmt.where(self.date_column < until)
+        if after_id is not None:
+            stmt = stmt.where(self.model.id > after_id)
+        return stmt.order_by(self.model.id)
+
+    def prepare(self, rows):
+        # Hook turning one chunk of query rows into (names, row tuples)
+        return self.names, rows
+
+
+class SurveyExport(ExportDataset):
+    def __init__(self):
+        super().__init__(
+            LSASSurvey,
+            [
+                LSASSurvey.id,
+                LSASSurvey.patient_id,
+                LSASSurvey.submission_date,
+                LSASSurvey.total_score,
+                LSASSurvey.anxiety_level,
+                LSASSurvey.packed_responses,
+            ],
+            LSASSurvey.submission_date,
+            LSASSurvey.patient_id,
+        )
+
+    def prepare(self, rows):
+        # Packed bytes -> 48 rating columns, unpacked for the whole chunk
+        names = self.names[:-1] + _RATING_COLUMNS
+        if not rows:
+            return names, []
+        packed = [row[-1] for row in rows]
+        present = [value is not None for value in packed]
+        ratings = np.zeros((len(rows), len(_RATING_COLUMNS)), dtype=np.uint8)
+        if any(present):
+            ratings[present] = unpack_responses(
+                value for value in packed if value is not None
+            ).reshape(-1, len(_RATING_COLUMNS))
+        ratings = ratings.tolist()
+        empty = (None,) * len(_RATING_COLUMNS)
+        return names, [
+            tuple(row[:-1]) + (tuple(item) if has_ratings else empty)
+            for row, item, has_ratings in zip(rows, ratings, present)
+        ]
+
+
+EXPORT_DATASETS = {
+    "surveys": SurveyExport(),
+    "recommendations": ExportDataset(
+        Recommendation,
+        [
+            Recommendation.id,
+            Recommendation.survey_id,
+            LSASSurvey.patient_id,
+            Recommendation.created_at,
+            Recommendation.selected,
+            Recommendation.content,
+        ],
+        Recommendation.created_at,
+        LSASSurvey.patient_id,
+        join=(LSASSurvey, LSASSurvey.id == Recommendation.survey_id),
+    ),
+    "exercises": ExportDataset(
+        AssignedExercise,
+        [
+            AssignedExercise.id,
+            AssignedExercise.patient_id,
+            AssignedExercise.assigned_date,
+            AssignedExercise.completed,
+            AssignedExercise.completion_date,
+            AssignedExercise.content,
+        ],
+        AssignedExercise.assigned_date,
+        AssignedExercise.patient_id,
+    ),
+}
+
+
+def iter_chunks(conn, dataset: ExportDataset, chunk_size=EXPORT_CHUNK_SIZE, **filters):
+    """Yield (column names, list of row tuples), `chunk_size` rows at a time.
+
+    `filters` are those of ExportDataset.query. The result is streamed with
+    yield_per, so memory is bounded by one chunk.
+    """
+    stmt = dataset.query(**filters).execution_options(yield_per=chunk_size)
+    result = conn.execute(stmt)
+    for partition in result.partitions():
+        yield dataset.prepare([tuple(row) for row in partition])
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def _encode_csv(chunks):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    header = True
+    for names, rows in chunks:
+        if header:
+            writer.writerow(names)
+            header = False
+        writer.writerows(
+            [
+                [value.isoformat() if isinstance(value, datetime) else value for value in row]
+                for row in rows
+            ]
+        )
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def _encode_ndjson(chunks):
+    for names, rows in chunks:
+        yield "".join(
+            json.dumps(dict(zip(names, row)), default=_json_default) + "\n"
+            for row in rows
+        ).encode()
+
+
+class _ChunkSink(io.RawIOBase):
+    # File-like target for the Parquet writer; bytes are drained per chunk
+    def __init__(self):
+        self.parts = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self) -> bytes:
+        data = b"".join(self.parts)
+        self.parts = []
+        return data
+
+
+def _parquet_schema(dataset: ExportDataset, names):
+    import pyarrow as pa
+
+    types = {
+        int: pa.int64(),
+        float: pa.float64(),
+        bool: pa.bool_(),
+        str: pa.string(),
+        datetime: pa.timestamp("us"),
+    }
+    fields = []
+    for column in dataset.columns:
+        try:
+            python_type = column.type.python_type
+        except NotImplementedError:
+            python_type = str
+        if column.key in names:
+            fields.append(pa.field(column.key, types.get(python_type, pa.string())))
+    fields += [pa.field(name, pa.uint8()) for name in names if name in _RATING_COLUMNS]
+    return pa.schema(fields)
+
+
+def _encode_parquet(chunks, dataset: ExportDataset):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    sink = _ChunkSink()
+    writer = None
+    for names, rows in chunks:
+        if writer is None:
+            schema = _parquet_schema(dataset, names)
+            writer = pq.ParquetWriter(sink, schema, compression="zstd")
+        if not rows:
+            continue
+        # Rows -> columns, one row group per chunk
+        columns = list(zip(*rows))
+        writer.write_table(
+            pa.Table.from_arrays(
+                [pa.array(values, type=field.type) for values, field in zip(columns, schema)],
+                schema=schema,
+            )
+        )
+        yield sink.drain()
+    if writer is not None:
+        writer.close()
+        yield sink.drain()
+
+
+def parquet_available() -> bool:
+    try:
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def encode(chunks, fmt: str, dataset: ExportDataset):
+    """Encode iter_chunks output as a stream of byte strings in `fmt`."""
+    if fmt == "csv":
+        return _encode_csv(chunks)
+    if fmt == "ndjson":
+        return _encode_ndjson(chunks)
+    if fmt == "parquet":
+        return _encode_parquet(chunks, dataset)
+    raise ValueError(f"Unknown export format: {fmt!r}")
+
+
+def stream_export(
+    engine, name: str, fmt: str, chunk_size: int = EXPORT_CHUNK_SIZE, progress=None, **filters
+):
+    """Yield the encoded export, holding one connection for its duration.
+
+    `progress`, if given, is called with (rows so far, last id) per chunk.
+    """
+    dataset = EXPORT_DATASETS[name]
+    with engine.connect() as conn:
+
+        def chunks():
+            rows = 0
+            for names, chunk in iter_chunks(conn, dataset, chunk_size, **filters):
+                rows += len(chunk)
+                if progress is not None and chunk:
+                    progress(rows, chunk[-1][0])
+                yield names, chunk
+
+        yield from encode(chunks(), fmt, dataset)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("dataset", choices=EXPORT_DATASETS)
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default="csv")
+    parser.add_argument("--doctor-id", type=int)
+    parser.add_argument("--since", type=datetime.fromisoformat)
+    parser.add_argument("--until", type=datetime.fromisoformat)
+    parser.add_argument("--after-id", type=int, help="resume after this id")
+    parser.add_argument("--chunk-size", type=int, default=EXPORT_CHUNK_SIZE)
+    parser.add_argument("-o", "--output", help="defaults to stdout")
+    args = parser.parse_args()
+    if args.format == "parquet" and not parquet_available():
+        parser.error("Parquet export needs pyarrow")
+
+    from .engine import engine
+
+    state = {"rows": 0, "last_id": args.after_id}
+
+    def progress(rows, last_id):
+        state.update(rows=rows, last_id=last_id)
+
+    start = time.perf_counter()
+    output = open(args.output, "wb") if args.output else sys.stdout.buffer
+    try:
+        for data in stream_export(
+            engine,
+            args.dataset,
+            args.format,
+            chunk_size=args.chunk_size,
+            progress=progress,
+            doctor_id=args.doctor_id,
+            since=args.since,
+            until=args.until,
+            after_id=args.after_id,
+        ):
+            output.write(data)
+    finally:
+        if args.output:
+            output.close()
+        # Printed even when interrupted, so the export can be resumed
+        print(
+            f"Exported {state['rows']} {args.dataset} in "
+            f"{time.perf_counter() - start:.1f}s; last id {state['last_id']} "
+            f"(resume with --after-id {state['last_id']})",
+            file=sys.stderr,
+        )
+
+
+if __name__ == "__main__":
+    main()
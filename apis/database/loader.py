@@ -0,0 +1,313 @@
+"""Bulk loader for staging and load-test databases.
+
+    DATABASE_URL=sqlite:///./staging.db python -m database.loader --source data/
+    DATABASE_URL=sqlite:///./loadtest.db python -m database.loader --generate 1000000
+
+Run from the apis directory. --source reads doctors, patients, surveys,
+recommendations and exercises from <name>.csv or <name>.ndjson files in a
+directory; --generate creates a synthetic clinic (benchmarks.synthetic).
+Rows go in with Core executemany inside one transaction, with secondary
+indexes dropped during the load and rebuilt afterwards.
+"""
+import argparse
+import csv
+import itertools
+import json
+import sys
+import time
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from pathlib import Path
+
+from sqlalchemy import insert
+
+from models.lsas import get_anxiety_level
+from .database_creation import (
+    AssignedExercise,
+    Doctor,
+    LSASSurvey,
+    Patient,
+    Recommendation,
+    create_schema,
+)
+from .lsas_responses import LSAS_ITEM_COUNT, pack_ratings
+from .patient_stats import rebuild_patient_stats
+
+# Source name -> model, in foreign key order
+LOAD_TABLES = {
+    "doctors": Doctor,
+    "patients": Patient,
+    "surveys": LSASSurvey,
+    "recommendations": Recommendation,
+    "exercises": AssignedExercise,
+}
+LOAD_CHUNK_SIZE = 50_000
+
+_RATING_COLUMNS = [
+    (f"fear_{item}", f"avoidance_{item}") for item in range(1, LSAS_ITEM_COUNT + 1)
+]
+
+
+def read_rows(path: Path):
+    # CSV rows come back as strings and are converted in load_rows
+    path = Path(path)
+    with path.open(newline="", encoding="utf-8") as f:
+        if path.suffix == ".csv":
+            yield from csv.DictReader(f)
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def _parse_bool(value) -> bool:
+    if isinstance(value, str):
+        return value.strip().lower() in ("1", "true", "yes", "t")
+    return bool(value)
+
+
+def _parse_bytes(value) -> bytes:
+    return bytes.fromhex(value) if isinstance(value, str) else value
+
+
+def _parse_datetime(value) -> datetime:
+    return datetime.fromisoformat(value) if isinstance(value, str) else value
+
+
+_PARSERS = {
+    int: int,
+    float: float,
+    bool: _parse_bool,
+    bytes: _parse_bytes,
+    datetime: _parse_datetime,
+}
+
+
+def _column_converters(table, dialect) -> dict:
+    # Per column: source value (possibly a CSV string) -> DBAPI value
+    converters = {}
+    for column in table.columns:
+        try:
+            python_type = column.type.python_type
+        except NotImplementedError:
+            python_type = str
+        parse = _PARSERS.get(python_type, str)
+        # The dialect's own type, so values are stored in the same format as
+        # ORM writes (e.g. SQLite datetimes with microseconds)
+        bind = column.type.dialect_impl(dialect).bind_processor(dialect)
+        if bind is None:
+            converters[column.name] = parse
+        else:
+            converters[column.name] = lambda value, parse=parse, bind=bind: bind(
+                parse(value)
+            )
+    return converters
+
+
+def _blank(value) -> bool:
+    return value is None or value == ""
+
+
+def _ratings(row: dict):
+    # fear_N/avoidance_N cells -> 48 ints in slot order, or None when all are
+    # blank (exported surveys stored without item answers)
+    values = [(name, row.pop(name)) for pair in _RATING_COLUMNS for name in pair]
+    if all(_blank(value) for _, value in values):
+        return None
+    for name, value in values:
+        if _blank(value):
+            raise ValueError(f"Survey {row.get('id', '')}: {name} is blank")
+    return [int(value) for _, value in values]
+
+
+def prepare_survey(row: dict) -> dict:
+    """Fill packed_responses, total_score and anxiety_level from item answers.
+
+    Answers come as `responses` (a list of QuestionResponse-like dicts) or as
+    fear_N/avoidance_N columns; rows that already carry a total are kept.
+    Rows whose rating columns are all blank are stored without item
+    answers; a blank among given ratings raises ValueError.
+    """
+    ratings = None
+    if row.get("responses"):
+        ratings = [0] * (LSAS_ITEM_COUNT * 2)
+        for response in row.pop("responses"):
+            slot = (int(response["question_id"]) - 1) * 2
+            ratings[slot] = int(response["fear_rating"])
+            ratings[slot + 1] = int(response["avoidance_rating"])
+    elif "fear_1" in row:
+        ratings = _ratings(row)
+
+    if ratings is not None:
+        row["packed_responses"] = pack_ratings(ratings)
+        row.setdefault("total_score", sum(ratings))
+    # Always present: load_rows takes its columns from the first row
+    row.setdefault("packed_responses", None)
+    if not row.get("anxiety_level"):
+        row["anxiety_level"] = get_anxiety_level(int(row["total_score"])).value
+    return row
+
+
+def load_rows(conn, table, rows, chunk_size: int = LOAD_CHUNK_SIZE) -> int:
+    """Insert row dicts into `table` with executemany, `chunk_size` at a time.
+
+    Every row must have the keys of the first one; keys that are not columns
+    are ignored and empty strings (missing CSV cells) become NULL. The
+    insert is compiled once and rows are converted straight to DBAPI
+    parameters, which is several times faster than per-row Core processing.
+    """
+    rows = iter(rows)
+    first = next(rows, None)
+    if first is None:
+        return 0
+
+    converters = _column_converters(table, conn.dialect)
+    names = [name for name in first if name in converters]
+    compiled = insert(table).compile(dialect=conn.dialect, column_keys=names)
+    keys = compiled.positiontup if conn.dialect.positional else names
+    columns = [(key, converters[key]) for key in keys]
+
+    def parameters(row):
+        values = [
+            None if (value := row.get(key)) is None or value == "" else convert(value)
+            for key, convert in columns
+        ]
+        return tuple(values) if conn.dialect.positional else dict(zip(keys, values))
+
+    count = 0
+    rows = itertools.chain([first], rows)
+    while chunk := list(itertools.islice(rows, chunk_size)):
+        conn.exec_driver_sql(compiled.string, [parameters(row) for row in chunk])
+        count += len(chunk)
+    return count
+
+
+@contextmanager
+def deferred_indexes(conn, tables):
+    # Building an index once over the loaded rows is much cheaper than
+    # updating it for every insert
+    indexes = [index for table in tables for index in table.indexes]
+    for index in indexes:
+        index.drop(conn, checkfirst=True)
+    yield
+    for index in indexes:
+        index.create(conn)
+
+
+def bulk_load(
+    engine, sources: dict, defer_indexes: bool = True, chunk_size: int = LOAD_CHUNK_SIZE
+) -> dict:
+    """Load rows into the tables named in LOAD_TABLES.
+
+    `sources` maps a name from LOAD_TABLES to an iterable of row dicts.
+    The schema is created first if needed. Everything is loaded in one
+    transaction; patient survey statistics are rebuilt when surveys were
+    loaded. Returns the row count per source. Cached API responses are left
+    to the caller (see main).
+    """
+    create_schema(engine)
+    counts = {}
+    tables = [LOAD_TABLES[name].__table__ for name in LOAD_TABLES if name in sources]
+    sqlite = engine.dialect.name == "sqlite"
+
+    with engine.connect() as conn:
+        if sqlite:
+            # A crash mid-load leaves a database that gets reloaded anyway
+            synchronous = conn.exec_driver_sql("PRAGMA synchronous").scalar()
+            conn.exec_driver_sql("PRAGMA synchronous = OFF")
+            conn.commit()
+
+        try:
+            with conn.begin():
+                with deferred_indexes(conn, tables) if defer_indexes else nullcontext():
+                    for name, model in LOAD_TABLES.items():
+                        if name not in sources:
+                            continue
+                        rows = sources[name]
+                        if model is LSASSurvey:
+                            rows = map(prepare_survey, rows)
+                        counts[name] = load_rows(conn, model.__table__, rows, chunk_size)
+
+                if "surveys" in counts:
+                    rebuild_patient_stats(conn)
+        finally:
+            # The connection goes back to the pool; it must not stay unsynced
+            # when the load fails
+            if sqlite:
+                conn.exec_driver_sql(f"PRAGMA synchronous = {synchronous}")
+                conn.commit()
+
+        if sqlite:
+            conn.exec_driver_sql("ANALYZE")
+            conn.commit()
+
+    return counts
+
+
+def file_sources(directory: Path) -> dict:
+    sources = {}
+    for name in LOAD_TABLES:
+        for suffix in (".ndjson", ".csv"):
+            path = Path(directory) / f"{name}{suffix}"
+            if path.exists():
+                sources[name] = read_rows(path)
+                break
+    return sources
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--source", type=Path, help="directory of CSV/NDJSON files")
+    source.add_argument("--generate", type=int, metavar="SURVEYS", help="synthetic clinic size")
+    parser.add_argument("--patients-per-doctor", type=int, default=50)
+    parser.add_argument("--surveys-per-patient", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--chunk-size", type=int, default=LOAD_CHUNK_SIZE)
+    parser.add_argument(
+        "--keep-indexes",
+        action="store_true",
+        help="maintain indexes during the load, e.g. when adding to a large database",
+    )
+    args = parser.parse_args()
+
+    from .engine import engine
+
+    if args.source:
+        sources = file_sources(args.source)
+        if not sources:
+            parser.error(f"no CSV or NDJSON files for {', '.join(LOAD_TABLES)} in {args.source}")
+    else:
+        from benchmarks.synthetic import synthetic_clinic
+
+        sources = synthetic_clinic(
+            args.generate,
+            patients_per_doctor=args.patients_per_doctor,
+            surveys_per_patient=args.surveys_per_patient,
+            seed=args.seed,
+        )
+
+    start = time.perf_counter()
+    try:
+        counts = bulk_load(
+            engine, sources, defer_indexes=not args.keep_indexes, chunk_size=args.chunk_size
+        )
+    except ValueError as exc:
+        # Bad source data; nothing was loaded
+        sys.exit(f"Load failed: {exc}")
+    elapsed = time.perf_counter() - start
+
+    # Workers sharing a RESPONSE_CACHE_BACKEND=sqlite cache drop what they
+    # served from the old data
+    from response_cache import ALL_SCOPES, response_cache
+
+    response_cache.invalidate_blocking(ALL_SCOPES)
+    total = sum(counts.values())
+    print(
+        f"Loaded {', '.join(f'{count} {name}' for name, count in counts.items())} "
+        f"in {elapsed:.1f}s ({total / elapsed:,.0f} rows/s)"
+    )
+
+
+if __name__ == "__main__":
+    main()
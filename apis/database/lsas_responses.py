@@ -0,0 +1,58 @@
+import numpy as np
+
+# Item-level LSAS answers are stored as 48 two-bit ratings packed into 12
+# bytes. Item i (1-24) occupies slots 2*(i-1) (fear) and 2*(i-1)+1
+# (avoidance); four slots per byte, lowest bits first.
+LSAS_ITEM_COUNT = 24
+PACKED_RESPONSES_SIZE = LSAS_ITEM_COUNT * 2 // 4
+
+_SHIFTS = np.array([0, 2, 4, 6], dtype=np.uint8)
+
+
+def pack_ratings(ratings) -> bytes:
+    """Encode ratings in slot order into packed rows, concatenated.
+
+    `ratings` is an (n_surveys, 48) array, or (n_surveys, 24, 2) as returned
+    by unpack_responses; a single survey's 48 ratings may be passed flat.
+    Survey i occupies bytes [12 * i, 12 * (i + 1)) of the result.
+    """
+    ratings = np.asarray(ratings, dtype=np.uint8) & 0b11
+    slots = ratings.reshape(-1, PACKED_RESPONSES_SIZE, 4)
+    return (slots << _SHIFTS).sum(axis=2, dtype=np.uint8).tobytes()
+
+
+def pack_responses(responses) -> bytes:
+    # `responses` are QuestionResponse-like objects with question ids 1-24
+    ratings = [0] * (LSAS_ITEM_COUNT * 2)
+    for response in responses:
+        slot = (response.question_id - 1) * 2
+        ratings[slot] = response.fear_rating
+        ratings[slot + 1] = response.avoidance_rating
+    return pack_ratings(ratings)
+
+
+def unpack_responses(packed_rows) -> np.ndarray:
+    """Decode packed rows into an (n_surveys, 24, 2) uint8 array.
+
+    The last axis holds (fear, avoidance). Rows must not be None; filter on
+    `LSASSurvey.packed_responses.isnot(None)` when querying.
+    """
+    packed_rows = list(packed_rows)
+    if not packed_rows:
+        return np.zeros((0, LSAS_ITEM_COUNT, 2), dtype=np.uint8)
+
+    raw = np.frombuffer(b"".join(packed_rows), dtype=np.uint8)
+    raw = raw.reshape(len(packed_rows), PACKED_RESPONSES_SIZE)
+    ratings = (raw[:, :, np.newaxis] >> _SHIFTS) & 0b11
+    return ratings.reshape(len(packed_rows), LSAS_ITEM_COUNT, 2)
+
+
+def subscale_scores(ratings: np.ndarray) -> dict:
+    # `ratings` as returned by unpack_responses
+    totals = ratings.sum(axis=1, dtype=np.int32)
+    return {
+        "fear": totals[:, 0],
+        "avoidance": totals[:, 1],
+        "total": totals.sum(axis=1),
+        "per_situation": ratings.sum(axis=2, dtype=np.int32),
+    }
@@ -0,0 +1,173 @@
+from sqlalchemy import case, delete, func, insert, literal, select, union_all
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from .database_creation import LSASMonthlySummary, LSASSurvey, PatientSurveyStats
+
+_stats = PatientSurveyStats.__table__
+_surveys = LSASSurvey.__table__
+_summaries = LSASMonthlySummary.__table__
+
+
+def _fold(surveys, key):
+    # Aggregate survey dicts per key(survey), which returns the key columns
+    groups = {}
+    for survey in surveys:
+        score = survey["total_score"]
+        date = survey["submission_date"]
+        columns = key(survey)
+        group_key = tuple(columns.values())
+        stats = groups.get(group_key)
+        if stats is None:
+            groups[group_key] = {
+                **columns,
+                "survey_count": 1,
+                "score_sum": score,
+                "min_score": score,
+                "max_score": score,
+                "first_date": date,
+                "last_date": date,
+                "last_anxiety_level": survey["anxiety_level"],
+            }
+            continue
+
+        stats["survey_count"] += 1
+        stats["score_sum"] += score
+        stats["min_score"] = min(stats["min_score"], score)
+        stats["max_score"] = max(stats["max_score"], score)
+        stats["first_date"] = min(stats["first_date"], date)
+        if date >= stats["last_date"]:
+            stats["last_date"] = date
+            stats["last_anxiety_level"] = survey["anxiety_level"]
+    return list(groups.values())
+
+
+def _merge_aggregates(db, table, key_columns, rows):
+    # Upsert folded aggregates, combining them with any existing row
+    if not rows:
+        return
+
+    stmt = sqlite_insert(table)
+    new = stmt.excluded
+    # Historical imports may be older than what is already recorded
+    is_newer = new.last_date >= table.c.last_date
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c[name] for name in key_columns],
+        set_={
+            "survey_count": table.c.survey_count + new.survey_count,
+            "score_sum": table.c.score_sum + new.score_sum,
+            "min_score": func.min(table.c.min_score, new.min_score),
+            "max_score": func.max(table.c.max_score, new.max_score),
+            "first_date": func.min(table.c.first_date, new.first_date),
+            "last_date": case((is_newer, new.last_date), else_=table.c.last_date),
+            "last_anxiety_level": case(
+                (is_newer, new.last_anxiety_level),
+                else_=table.c.last_anxiety_level,
+            ),
+        },
+    )
+    db.execute(stmt, rows)
+
+
+def record_surveys(db, surveys):
+    """Fold newly inserted surveys into the per-patient running aggregates.
+
+    `surveys` are dicts with patient_id, total_score, anxiety_level and
+    submission_date. Call inside the transaction that inserts them.
+    """
+    rows = _fold(surveys, lambda survey: {"patient_id": survey["patient_id"]})
+    _merge_aggregates(db, _stats, ["patient_id"], rows)
+
+
+def month_start(date):
+    return date.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def record_monthly_summaries(db, surveys):
+    # Like record_surveys, into lsas_monthly_summaries; used when surveys
+    # are archived, so their statistics stay readable
+    rows = _fold(
+        surveys,
+        lambda survey: {
+            "patient_id": survey["patient_id"],
+            "month": month_start(survey["submission_date"]),
+        },
+    )
+    _merge_aggregates(db, _summaries, ["patient_id", "month"], rows)
+
+
+def rebuild_patient_stats(db):
+    # Recompute every patient's aggregates in one statement, from
+    # lsas_surveys plus the monthly summaries of archived surveys
+    merged = union_all(
+        select(
+            _surveys.c.patient_id,
+            literal(1).label("survey_count"),
+            _surveys.c.total_score.label("score_sum"),
+            _surveys.c.total_score.label("min_score"),
+            _surveys.c.total_score.label("max_score"),
+            _surveys.c.submission_date.label("first_date"),
+            _surveys.c.submission_date.label("last_date"),
+        ),
+        select(
+            _summaries.c.patient_id,
+            _summaries.c.survey_count,
+            _summaries.c.score_sum,
+            _summaries.c.min_score,
+            _summaries.c.max_score,
+            _summaries.c.first_date,
+            _summaries.c.last_date,
+        ),
+    ).subquery()
+
+    latest = _surveys.alias("latest")
+    latest_summary = _summaries.alias("latest_summary")
+    last_anxiety_level = func.coalesce(
+        select(latest.c.anxiety_level)
+        .where(latest.c.patient_id == merged.c.patient_id)
+        .order_by(latest.c.submission_date.desc(), latest.c.id.desc())
+        .limit(1)
+        .scalar_subquery(),
+        select(latest_summary.c.last_anxiety_level)
+        .where(latest_summary.c.patient_id == merged.c.patient_id)
+        .order_by(latest_summary.c.month.desc())
+        .limit(1)
+        .scalar_subquery(),
+    )
+    aggregates = select(
+        merged.c.patient_id,
+        func.sum(merged.c.survey_count),
+        func.sum(merged.c.score_sum),
+        func.min(merged.c.min_score),
+        func.max(merged.c.max_score),
+        func.min(merged.c.first_date),
+        func.max(merged.c.last_date),
+        last_anxiety_level,
+    ).group_by(merged.c.patient_id)
+
+    db.execute(delete(_stats))
+    db.execute(
+        insert(_stats).from_select(
+            [
+                "patient_id",
+                "survey_count",
+                "score_sum",
+                "min_score",
+                "max_score",
+                "first_date",
+                "last_date",
+                "last_anxiety_level",
+            ],
+            aggregates,
+        )
+    )
+
+
+if __name__ == "__main__":
+    # Backfill: python -m database.patient_stats (from the apis directory)
+    from .database_creation import create_schema
+    from .engine import engine
+
+    create_schema(engine)
+    with engine.begin() as conn:
+        rebuild_patient_stats(conn)
+    print("Rebuilt patient survey statistics")
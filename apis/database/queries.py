@@ -0,0 +1,275 @@
+import asyncio
+from datetime import datetime
+
+from sqlalchemy import Integer, and_, case, cast, func, literal, null, or_, select, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .database_creation import (
+    AssignedExercise,
+    LSASMonthlySummary,
+    LSASSurvey,
+    Patient,
+)
+
+
+async def execute_read(db, stmt):
+    # Runs a statement on either an AsyncSession or a blocking Session, so
+    # read endpoints can be served from both paths without duplication
+    if isinstance(db, AsyncSession):
+        return await db.execute(stmt)
+    return await asyncio.to_thread(db.execute, stmt)
+
+
+def _fetch_raw_rows(session, stmt):
+    connection = session.connection()
+    compiled = stmt.compile(dialect=connection.dialect)
+    params = compiled.construct_params()
+    cursor = connection.connection.cursor()
+    try:
+        cursor.execute(
+            str(compiled), [params[name] for name in compiled.positiontup]
+        )
+        return cursor.fetchall()
+    finally:
+        cursor.close()
+
+
+async def fetch_raw_rows(db, stmt):
+    """Run a large read and return plain DBAPI tuples.
+
+    Skips Row construction and result type processing, which dominate scans
+    of millions of rows feeding NumPy. Bound parameters are passed through
+    unprocessed, so keep them to plain ints and strings.
+    """
+    if isinstance(db, AsyncSession):
+        return await db.run_sync(_fetch_raw_rows, stmt)
+    return await asyncio.to_thread(_fetch_raw_rows, db, stmt)
+
+
+def rows_as_dicts(rows) -> list:
+    # Response models validate plain dicts several times faster than Row
+    # objects, whose attribute access goes through Python
+    if not rows:
+        return []
+    keys = rows[0]._fields
+    return [dict(zip(keys, row)) for row in rows]
+
+
+def latest_surveys_for_doctor(doctor_id: int, skip: int = 0, limit: int = 100):
+    # Page the doctor's patients first, ordered by their latest survey date
+    # (one max() seek per patient on the (patient_id, submission_date)
+    # index). Patients without surveys are sorted after everyone else.
+    latest_date = (
+        select(func.max(LSASSurvey.submission_date))
+        .where(LSASSurvey.patient_id == Patient.id)
+        .scalar_subquery()
+    )
+    latest_date = latest_date.label("latest_date")
+    page = (
+        select(Patient.id, Patient.name, latest_date)
+        .where(Patient.doctor_id == doctor_id)
+        .order_by(latest_date.desc().nulls_last(), Patient.id)
+        .offset(skip)
+        .limit(limit)
+        .subquery()
+    )
+
+    # Then only the page's latest surveys are read, newest first by the
+    # same index, so the cost follows the page size, not the history
+    latest_id = (
+        select(LSASSurvey.id)
+        .where(LSASSurvey.patient_id == page.c.id)
+        .order_by(LSASSurvey.submission_date.desc(), LSASSurvey.id.desc())
+        .limit(1)
+        .correlate(page)
+        .scalar_subquery()
+    )
+    stmt = (
+        select(
+            page.c.id,
+            page.c.name,
+            LSASSurvey.id.label("survey_id"),
+            LSASSurvey.total_score,
+            LSASSurvey.anxiety_level,
+            LSASSurvey.submission_date,
+        )
+        .select_from(page)
+        .outerjoin(LSASSurvey, LSASSurvey.id == latest_id)
+        .order_by(page.c.latest_date.desc().nulls_last(), page.c.id)
+    )
+
+    return stmt
+
+
+# SQLite expressions truncating a timestamp to the start of its bucket
+# (weeks start on Monday)
+SURVEY_BUCKETS = {
+    "day": lambda column: func.date(column),
+    "week": lambda column: func.date(column, "weekday 0", "-6 days"),
+    "month": lambda column: func.strftime("%Y-%m-01", column),
+}
+
+
+def survey_score_buckets(patient_id: int, since: datetime, bucket: str):
+    # Recent surveys merged with the monthly summaries of archived ones. A
+    # summary falls in the bucket of its month's first day, so day and week
+    # buckets are only exact for surveys that are still in detail.
+    truncate = SURVEY_BUCKETS[bucket]
+    merged = union_all(
+        select(
+            truncate(LSASSurvey.submission_date).label("period_start"),
+            literal(1).label("count"),
+            LSASSurvey.total_score.label("score_sum"),
+            LSASSurvey.total_score.label("min_score"),
+            LSASSurvey.total_score.label("max_score"),
+        ).where(
+            LSASSurvey.patient_id == patient_id,
+            LSASSurvey.submission_date >= since,
+        ),
+        select(
+            truncate(LSASMonthlySummary.month).label("period_start"),
+            LSASMonthlySummary.survey_count,
+            LSASMonthlySummary.score_sum,
+            LSASMonthlySummary.min_score,
+            LSASMonthlySummary.max_score,
+        ).where(
+            LSASMonthlySummary.patient_id == patient_id,
+            LSASMonthlySummary.last_date >= since,
+        ),
+    ).subquery()
+    return (
+        select(
+            merged.c.period_start,
+            func.sum(merged.c.count).label("count"),
+            func.min(merged.c.min_score).label("min_score"),
+            (func.sum(merged.c.score_sum) * 1.0 / func.sum(merged.c.count)).label(
+                "mean_score"
+            ),
+            func.max(merged.c.max_score).label("max_score"),
+        )
+        .group_by(merged.c.period_start)
+        .order_by(merged.c.period_start)
+    )
+
+
+def survey_points_page(
+    patient_id: int,
+    limit: int,
+    since: datetime = None,
+    before_date: datetime = None,
+    before_id: int = None,
+):
+    # Keyset pagination, newest first: the page after a cursor continues
+    # strictly below its (submission_date, id)
+    stmt = select(
+        LSASSurvey.id,
+        LSASSurvey.submission_date,
+        LSASSurvey.total_score,
+        LSASSurvey.anxiety_level,
+        null().label("survey_count"),
+    ).where(LSASSurvey.patient_id == patient_id)
+    if since is not None:
+        stmt = stmt.where(LSASSurvey.submission_date >= since)
+    if before_date is not None:
+        stmt = stmt.where(
+            or_(
+                LSASSurvey.submission_date < before_date,
+                and_(
+                    LSASSurvey.submission_date == before_date,
+                    LSASSurvey.id < before_id,
+                ),
+            )
+        )
+    return stmt.order_by(
+        LSASSurvey.submission_date.desc(), LSASSurvey.id.desc()
+    ).limit(limit)
+
+
+def summary_points_page(
+    patient_id: int,
+    limit: int,
+    since: datetime = None,
+    before_date: datetime = None,
+    before_id: int = None,
+):
+    # Archived months as points with the same columns as survey_points_page:
+    # dated at the month's start, with the mean score and an id of 0 so they
+    # sort after any survey on the same date
+    month = LSASMonthlySummary.month
+    stmt = select(
+        literal(0).label("id"),
+        month.label("submission_date"),
+        cast(
+            func.round(LSASMonthlySummary.score_sum * 1.0 / LSASMonthlySummary.survey_count),
+            Integer,
+        ).label("total_score"),
+        LSASMonthlySummary.last_anxiety_level.label("anxiety_level"),
+        LSASMonthlySummary.survey_count,
+    ).where(LSASMonthlySummary.patient_id == patient_id)
+    if since is not None:
+        stmt = stmt.where(LSASMonthlySummary.last_date >= since)
+    if before_date is not None:
+        # Only a survey cursor (id > 0) has a summary left on its own date
+        stmt = stmt.where(month <= before_date if before_id > 0 else month < before_date)
+    return stmt.order_by(month.desc()).limit(limit)
+
+
+def exercise_feed_page(
+    patient_id: int,
+    completed: bool,
+    limit: int,
+    before_date: datetime = None,
+    before_id: int = None,
+):
+    # Keyset pagination, newest first, read straight off the
+    # (patient_id, completed, assigned_date) index
+    stmt = select(
+        AssignedExercise.id,
+        AssignedExercise.patient_id,
+        AssignedExercise.assigned_date,
+        AssignedExercise.content,
+        AssignedExercise.completed,
+        AssignedExercise.completion_date,
+    ).where(
+        AssignedExercise.patient_id == patient_id,
+        AssignedExercise.completed == completed,
+    )
+    if before_date is not None:
+        stmt = stmt.where(
+            or_(
+                AssignedExercise.assigned_date < before_date,
+                and_(
+                    AssignedExercise.assigned_date == before_date,
+                    AssignedExercise.id < before_id,
+                ),
+            )
+        )
+    return stmt.order_by(
+        AssignedExercise.assigned_date.desc(), AssignedExercise.id.desc()
+    ).limit(limit)
+
+
+def exercise_completion_by_patient(doctor_id: int, since: datetime = None):
+    # Per-patient counts aggregated in the database; patients without
+    # exercises are kept with zero counts
+    join_on = AssignedExercise.patient_id == Patient.id
+    if since is not None:
+        join_on = and_(join_on, AssignedExercise.assigned_date >= since)
+
+    assigned = func.count(AssignedExercise.id)
+    completed = func.coalesce(
+        func.sum(case((AssignedExercise.completed, 1), else_=0)), 0
+    )
+    return (
+        select(
+            Patient.id.label("patient_id"),
+            Patient.name.label("patient_name"),
+            assigned.label("assigned"),
+            completed.label("completed"),
+            (completed * 1.0 / func.nullif(assigned, 0)).label("completion_rate"),
+        )
+        .outerjoin(AssignedExercise, join_on)
+        .where(Patient.doctor_id == doctor_id)
+        .group_by(Patient.id, Patient.name)
+        .order_by(Patient.id)
+    )
@@ -0,0 +1,303 @@
+"""Retention: roll old surveys into monthly summaries and archive them.
+
+    python -m database.retention --older-than-days 730
+    python -m database.retention --max-batches 20 --no-vacuum
+
+Run from the apis directory. Surveys submitted before the start of the
+month RETENTION_DAYS ago are folded into lsas_monthly_summaries and their
+detail rows moved to a separate SQLite database (ARCHIVE_DATABASE_PATH,
+attached as "archive" while the command runs), together with their
+recommendations and finished recommendation jobs, so nothing is left
+pointing at a removed survey. History endpoints read the summaries in
+place of the archived rows. Recommendation batches keep their total_jobs,
+so an old batch whose surveys were archived reports fewer jobs than that.
+
+Work is done in batches of RETENTION_BATCH_SIZE surveys, one short
+transaction each, so the app keeps serving and an interrupted run simply
+continues where it stopped next time. Each patient's latest survey, and
+surveys with a recommendation still queued or running, are never archived.
+Afterwards the main database is VACUUMed and ANALYZEd, the space
+reclaimed is reported and the command invalidates cached API responses
+(this reaches running workers with RESPONSE_CACHE_BACKEND=sqlite; the
+memory backend relies on its TTL).
+
+A crash between the archive and main database commits (they are separate
+WAL files) can leave a row in both; it is copied with INSERT OR IGNORE and
+deleted again on the next run.
+"""
+import argparse
+import os
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import (
+    Boolean,
+    Column,
+    DateTime,
+    Integer,
+    LargeBinary,
+    MetaData,
+    String,
+    Table,
+    delete,
+    insert,
+    literal,
+    select,
+)
+
+from .database_creation import (
+    LSASSurvey,
+    Recommendation,
+    RecommendationJob,
+    create_schema,
+)
+from .patient_stats import month_start, record_monthly_summaries
+
+RETENTION_DAYS = int(os.getenv("RETENTION_DAYS", "730"))
+RETENTION_BATCH_SIZE = int(os.getenv("RETENTION_BATCH_SIZE", "5000"))
+# Defaults to <database>_archive.db next to the main database
+ARCHIVE_DATABASE_PATH = os.getenv("ARCHIVE_DATABASE_PATH")
+ARCHIVE_SCHEMA = "archive"
+
+_archive_metadata = MetaData(schema=ARCHIVE_SCHEMA)
+archived_surveys = Table(
+    "lsas_surveys",
+    _archive_metadata,
+    Column("id", Integer, primary_key=True),
+    Column("patient_id", Integer, index=True),
+    Column("submission_date", DateTime),
+    Column("total_score", Integer),
+    Column("anxiety_level", String),
+    Column("packed_responses", LargeBinary(12)),
+    Column("archived_at", DateTime),
+)
+archived_recommendations = Table(
+    "recommendations",
+    _archive_metadata,
+    Column("id", Integer, primary_key=True),
+    Column("survey_id", Integer, index=True),
+    Column("content", String),
+    Column("created_at", DateTime),
+    Column("selected", Boolean),
+    Column("archived_at", DateTime),
+)
+archived_jobs = Table(
+    "recommendation_jobs",
+    _archive_metadata,
+    Column("id", Integer, primary_key=True),
+    Column("survey_id", Integer, index=True),
+    Column("batch_id", Integer),
+    Column("status", String),
+    Column("error", String),
+    Column("recommendation_id", Integer),
+    Column("created_at", DateTime),
+    Column("started_at", DateTime),
+    Column("finished_at", DateTime),
+    Column("archived_at", DateTime),
+)
+
+_SURVEY_COLUMNS = [
+    "id",
+    "patient_id",
+    "submission_date",
+    "total_score",
+    "anxiety_level",
+    "packed_responses",
+]
+
+
+def default_archive_path(database_path: str) -> str:
+    root, ext = os.path.splitext(database_path)
+    return f"{root}_archive{ext or '.db'}"
+
+
+def retention_cutoff(now: datetime, days: int) -> datetime:
+    # Whole months only, so every summary covers a complete month
+    return month_start(now - timedelta(days=days))
+
+
+def eligible_surveys(cutoff: datetime, limit: int):
+    newest = LSASSurvey.__table__.alias("newest")
+    return (
+        select(*(LSASSurvey.__table__.c[name] for name in _SURVEY_COLUMNS))
+        .where(
+            LSASSurvey.submission_date < cutoff,
+            # Keep the patient's latest survey in detail
+            LSASSurvey.submission_date
+            < select(newest.c.submission_date)
+            .where(newest.c.patient_id == LSASSurvey.patient_id)
+            .order_by(newest.c.submission_date.desc())
+            .limit(1)
+            .scalar_subquery(),
+            ~select(RecommendationJob.id)
+            .where(
+                RecommendationJob.survey_id == LSASSurvey.id,
+                RecommendationJob.status.in_(("queued", "running")),
+            )
+            .exists(),
+        )
+        .order_by(LSASSurvey.id)
+        .limit(limit)
+    )
+
+
+def _move_to_archive(conn, table, archive, where, archived_at: datetime):
+    # Copied inside the database engine, across the attached file
+    columns = [column.name for column in archive.columns if column.name != "archived_at"]
+    conn.execute(
+        insert(archive)
+        .prefix_with("OR IGNORE")
+        .from_select(
+            columns + ["archived_at"],
+            select(*(table.c[name] for name in columns), literal(archived_at)).where(where),
+        )
+    )
+    conn.execute(delete(table).where(where))
+
+
+def compact_batch(conn, cutoff: datetime, batch_size: int) -> int:
+    """Archive and summarise up to `batch_size` surveys; returns how many.
+
+    Runs in its own transaction on a connection with the archive attached.
+    """
+    with conn.begin():
+        surveys = [row._asdict() for row in conn.execute(eligible_surveys(cutoff, batch_size))]
+        if not surveys:
+            return 0
+
+        archived_at = datetime.utcnow()
+        conn.execute(
+            insert(archived_surveys).prefix_with("OR IGNORE"),
+            [{**survey, "archived_at": archived_at} for survey in surveys],
+        )
+        record_monthly_summaries(conn, surveys)
+
+        # Rows referring to the surveys go with them (queued and running
+        # jobs never do: eligible_surveys skips their surveys)
+        survey_ids = [survey["id"] for survey in surveys]
+        for table, archive in (
+            (RecommendationJob.__table__, archived_jobs),
+            (Recommendation.__table__, archived_recommendations),
+        ):
+            _move_to_archive(conn, table, archive, table.c.survey_id.in_(survey_ids), archived_at)
+        conn.execute(delete(LSASSurvey.__table__).where(LSASSurvey.id.in_(survey_ids)))
+    return len(surveys)
+
+
+def _database_size(path: str) -> int:
+    # The database file plus its write-ahead log
+    return sum(
+        os.path.getsize(name) for name in (path, f"{path}-wal") if os.path.exists(name)
+    )
+
+
+def run_retention(
+    engine,
+    days: int = RETENTION_DAYS,
+    batch_size: int = RETENTION_BATCH_SIZE,
+    archive_path: str = None,
+    max_batches: int = None,
+    vacuum: bool = True,
+    now: datetime = None,
+) -> dict:
+    """Compact surveys older than `days` in batches; returns a report.
+
+    `max_batches` bounds one run (the next one continues). With `vacuum`,
+    the freed pages are returned to the file system afterwards. Cached API
+    responses are left to the caller (see main).
+    """
+    if engine.dialect.name != "sqlite":
+        raise ValueError("Retention needs a SQLite database")
+
+    database_path = engine.url.database
+    archive_path = archive_path or ARCHIVE_DATABASE_PATH or default_archive_path(
+        database_path
+    )
+    cutoff = retention_cutoff(now or datetime.utcnow(), days)
+    size_before = _database_size(database_path)
+    start = time.perf_counter()
+
+    archived = batches = 0
+    with engine.connect() as conn:
+        conn.exec_driver_sql(f"ATTACH DATABASE ? AS {ARCHIVE_SCHEMA}", (archive_path,))
+        try:
+            conn.commit()
+            _archive_metadata.create_all(conn)
+            conn.commit()
+            while max_batches is None or batches < max_batches:
+                count = compact_batch(conn, cutoff, batch_size)
+                if not count:
+                    break
+                archived += count
+                batches += 1
+        finally:
+            conn.rollback()
+            conn.exec_driver_sql(f"DETACH DATABASE {ARCHIVE_SCHEMA}")
+
+        remaining = conn.execute(eligible_surveys(cutoff, 1)).first() is not None
+        conn.commit()
+
+        if vacuum:
+            # VACUUM rewrites the file without the freed pages; the WAL is
+            # truncated so the space is really returned
+            conn.exec_driver_sql("VACUUM")
+            conn.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+        conn.exec_driver_sql("ANALYZE")
+        conn.commit()
+
+    size_after = _database_size(database_path)
+    return {
+        "cutoff": cutoff,
+        "archived_surveys": archived,
+        "batches": batches,
+        "complete": not remaining,
+        "archive_path": archive_path,
+        "size_before": size_before,
+        "size_after": size_after,
+        "reclaimed_bytes": size_before - size_after,
+        "seconds": round(time.perf_counter() - start, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--older-than-days", type=int, default=RETENTION_DAYS)
+    parser.add_argument("--batch-size", type=int, default=RETENTION_BATCH_SIZE)
+    parser.add_argument("--max-batches", type=int, help="stop after this many batches")
+    parser.add_argument("--archive", help="archive database file")
+    parser.add_argument("--no-vacuum", action="store_true", help="skip VACUUM (ANALYZE still runs)")
+    args = parser.parse_args()
+
+    from .engine import engine
+
+    # lsas_monthly_summaries may not exist yet on an older database
+    create_schema(engine)
+    report = run_retention(
+        engine,
+        days=args.older_than_days,
+        batch_size=args.batch_size,
+        archive_path=args.archive,
+        max_batches=args.max_batches,
+        vacuum=not args.no_vacuum,
+    )
+    if report["archived_surveys"]:
+        # History views now read the summaries; served copies are stale
+        from response_cache import ALL_SCOPES, response_cache
+
+        response_cache.invalidate_blocking(ALL_SCOPES)
+
+    mib = 1024 * 1024
+    print(
+        f"Archived {report['archived_surveys']} surveys before {report['cutoff']:%Y-%m-%d} "
+        f"in {report['batches']} batches ({report['seconds']}s) to {report['archive_path']}"
+    )
+    print(
+        f"Database {report['size_before'] / mib:.1f} MiB -> {report['size_after'] / mib:.1f} MiB, "
+        f"reclaimed {report['reclaimed_bytes'] / mib:.1f} MiB"
+    )
+    if not report["complete"]:
+        print("More surveys are eligible; run again to continue")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+"""Create or migrate the database schema.
+
+    python -m database.schema
+
+Run from the apis directory, against DATABASE_URL. Creates missing tables,
+appends columns added to existing models, creates missing indexes and
+backfills patient survey statistics the first time their table appears.
+Importing the app has no schema side effects; run this once per deploy
+(and start the workers with DB_CREATE_SCHEMA=0) so several workers booting
+at once don't race on the DDL.
+"""
+import argparse
+import time
+
+from sqlalchemy import inspect
+
+from .database_creation import Base, create_schema
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.parse_args()
+
+    from .engine import engine
+
+    start = time.perf_counter()
+    existing = set(inspect(engine).get_table_names())
+    create_schema(engine)
+    created = [table for table in Base.metadata.tables if table not in existing]
+    print(
+        f"Schema up to date on {engine.url.render_as_string()} "
+        f"({time.perf_counter() - start:.2f}s); "
+        f"created tables: {', '.join(created) or 'none'}"
+    )
+
+
+if __name__ == "__main__":
+    main()
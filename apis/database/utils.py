@@ -1,13 +1,16 @@
-from sqlalchemy import create_engine
+import os
+
+from sqlalchemy.ext.asyncio import async_sessionmaker
 from sqlalchemy.orm import sessionmaker
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./therapy_system.db"
+from .engine import async_engine, engine
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, autoflush=False, expire_on_commit=False
+)
+
 
 # Database Dependency
 def get_db():
@@ -16,3 +19,13 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+# Hot read endpoints use the async session; READ_DB_BACKEND=sync switches
+# them back to the blocking pool to compare throughput under concurrency
+get_read_db = get_db if os.getenv("READ_DB_BACKEND") == "sync" else get_async_db
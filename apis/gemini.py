@@ -1,35 +1,58 @@
-# Import necessary packages and define helper function to render output of models to markdown
-import requests
-import pathlib
-import textwrap
-import google.generativeai as genai
-from IPython.display import Markdown
+# Gemini prompt construction and the Gemini LLM backend. Run as a script
+# (or paste into Colab) to generate one recommendation for a sample level.
+import os
+
+from llm import LLMBackend, TransientLLMError
+from prompt_templates import get_prompt_registry
+
+
+class GeminiBackend(LLMBackend):
+  def __init__(self, model_name: str = "gemini-1.5-flash", api_key: str = None):
+    # Imported here so the server only needs the SDK when Gemini is used
+    import google.generativeai as genai
+    from google.api_core import exceptions
+
+    genai.configure(api_key=api_key or os.environ["GOOGLE_API_KEY"])
+    self.model_name = model_name
+    self._model = genai.GenerativeModel(model_name)
+    self._transient_errors = (
+      exceptions.ResourceExhausted,
+      exceptions.ServiceUnavailable,
+      exceptions.DeadlineExceeded,
+      exceptions.InternalServerError,
+    )
+
+  async def generate(self, prompt: str) -> str:
+    try:
+      response = await self._model.generate_content_async(prompt)
+    except self._transient_errors as exc:
+      raise TransientLLMError(str(exc)) from exc
+    return response.text
+
+  async def stream(self, prompt: str):
+    try:
+      response = await self._model.generate_content_async(prompt, stream=True)
+      async for chunk in response:
+        yield chunk.text
+    except self._transient_errors as exc:
+      raise TransientLLMError(str(exc)) from exc
 
-from google.colab import userdata
-GOOGLE_API_KEY=userdata.get('GOOGLE_API_KEY') # Grab API Key from your secrets
-genai.configure(api_key=GOOGLE_API_KEY)
 
 def to_markdown(text):
+  import textwrap
+  from IPython.display import Markdown
+
   text = text.replace('•', '  *')
   return Markdown(textwrap.indent(text, '> ', predicate=lambda _: True))
 
 def get_template_response(level):
-  lsas_responses = {
-    'mild': ['https://gist.githubusercontent.com/muallagunay/87c0a8724350b14ced9e143fa69261d3/raw/c9975df295e42399c73fd9ae7127c32d98ef8202/LSAS_results_mild.txt'],
-    'moderate': ['https://gist.githubusercontent.com/muallagunay/390c572dd08e76f1863475f8ba2b8afb/raw/6893cacc388a254555b260215f28bcfa4721f827/LSAS_results_moderate.txt'],
-    'marked': ['https://gist.githubusercontent.com/muallagunay/9981be8eaceeb7e2efd688b4307d44c9/raw/f86a905d8ee63e44908b6cbffa016b7d827a4fa2/LSAS_results_marked.txt'],
-    'severe': ['https://gist.githubusercontent.com/muallagunay/bc2f4f7f0145f56789952f0e721cf07f/raw/85f939fc4f4a06f79e053f83dcd4c186bd986f51/LSAS_results_severe.txt'],
-    'very_severe': ['https://gist.githubusercontent.com/muallagunay/cb8d1390215fd23400a7ef4d31e2f838/raw/556b5c035b9f3894098fe0f2163b55ec72cb0230/LSAS_results_very_severe.txt']
-  }
-
-  link = lsas_responses[level][0]
-
-  # Get the file content
-  response = requests.get(link)
+  # Sample LSAS responses ship in prompts/ and are served from memory
+  return get_prompt_registry().sample_results(level)
 
-  # Check if the request was successful
-  if response.status_code == 200:
-      return response.text  # The content of the file as a string
+# Bump whenever the wording produced by create_prompt changes, so cached
+# responses generated from the old prompt are no longer reused. Changes to
+# the files in prompts/ are covered by the registry's own version.
+PROMPT_TEMPLATE_VERSION = "1"
 
 def create_prompt(lsas_response):
   aim = "I am a cognitive behavioral therapist specializing in social anxiety in adults, could you please help me:"
@@ -65,14 +88,22 @@ def create_prompt(lsas_response):
 
   return prompt
 
-# Select a model and instantiate a GenerativeModel
-model = genai.GenerativeModel('gemini-1.5-flash')
+if __name__ == "__main__":
+  import asyncio
+
+  try:
+    from google.colab import userdata
+    os.environ.setdefault('GOOGLE_API_KEY', userdata.get('GOOGLE_API_KEY')) # Grab API Key from your secrets
+  except ImportError:
+    pass
+
+  # Select a model and instantiate a GenerativeModel
+  model = GeminiBackend('gemini-1.5-flash')
 
-lsas_response = get_template_response('mild') # 'mild', 'moderate', 'marked', 'severe', 'very_severe'
-prompt = create_prompt(lsas_response)
+  lsas_response = get_template_response('mild') # 'mild', 'moderate', 'marked', 'severe', 'very_severe'
+  prompt = create_prompt(lsas_response)
 
-# You can now use the model defind about to generate content base on inputs
-response = model.generate_content(prompt)
+  # You can now use the model defind about to generate content base on inputs
+  text = asyncio.run(model.generate(prompt))
 
-# This makes the response easier to read
-to_markdown(response.text)
\ No newline at end of file
+  print(text)
@@ -0,0 +1,259 @@
+import asyncio
+import hashlib
+import os
+import random
+import time
+from abc import ABC, abstractmethod
+from contextlib import aclosing
+
+from metrics import LLM_DURATION
+
+
+class TransientLLMError(Exception):
+    # Rate limiting or a temporary outage: the call may be retried, after
+    # `retry_after` seconds when the provider says so
+    def __init__(self, message: str, retry_after: float = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class LLMBackend(ABC):
+    """Text generation backend used for recommendations.
+
+    Subclasses implement `generate` and, when the model can stream, `stream`;
+    `model_name` identifies the model that produced a text.
+    """
+
+    model_name = "unknown"
+
+    @abstractmethod
+    async def generate(self, prompt: str) -> str:
+        ...
+
+    async def stream(self, prompt: str):
+        # Yields the text in chunks as it is produced; backends that cannot
+        # stream yield the whole text at once
+        yield await self.generate(prompt)
+
+
+_STUB_EXERCISES = {
+    "Mindfulness exercise": [
+        "Practise the five senses exercise: notice 5 things you see, 4 you hear, 3 you can touch, 2 you smell and 1 you taste.",
+        "Take a ten minute mindful walk, focusing on the rhythm of your breath and steps.",
+        "Repeat the anchor statement 'I can handle this moment' slowly three times when anxiety rises.",
+    ],
+    "Cognitive-behavioral exercise": [
+        "Fill in a thought record for one anxious moment today: situation, automatic thought, evidence for and against, balanced thought.",
+        "Write down one feared social prediction before an interaction and compare it with what actually happened.",
+        "Replace one self-critical thought with a kinder, realistic alternative and note how it changes your feelings.",
+    ],
+    "Art or crafting": [
+        "Draw your anxiety as a shape or colour, then draw how it looks after a few calm breaths.",
+        "Write a short letter to your social anxiety as if it were a person.",
+        "Build a playlist of songs that help you feel calm and confident.",
+    ],
+    "Resource": [
+        "Read 'The Shyness and Social Anxiety Workbook' by Antony and Swinson.",
+        "Listen to an episode of 'The Social Anxiety Solution' podcast.",
+        "Watch a talk where a speaker shares their experience with social anxiety.",
+    ],
+}
+
+
+class StubLLMBackend(LLMBackend):
+    # Deterministic offline backend: the same prompt always yields the same
+    # four-part plan, optionally after a simulated latency. Streaming waits
+    # `latency` for the first word and `chunk_delay` between words.
+    model_name = "stub"
+
+    def __init__(self, latency: float = 0.0, chunk_delay: float = 0.0):
+        self.latency = latency
+        self.chunk_delay = chunk_delay
+
+    async def generate(self, prompt: str) -> str:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self._plan(prompt)
+
+    async def stream(self, prompt: str):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        words = self._plan(prompt).split(" ")
+        for index, word in enumerate(words):
+            if index and self.chunk_delay:
+                await asyncio.sleep(self.chunk_delay)
+            yield word if index == len(words) - 1 else word + " "
+
+    def _plan(self, prompt: str) -> str:
+        digest = hashlib.sha256(prompt.encode()).digest()
+        return "\n\n".join(
+            f"{index}. {category}: {options[digest[index] % len(options)]}"
+            for index, (category, options) in enumerate(
+                _STUB_EXERCISES.items(), start=1
+            )
+        )
+
+
+class HTTPLLMBackend(LLMBackend):
+    """Backend for a plain JSON completion service.
+
+    POSTs {"prompt": ...} to `url` and reads {"text": ...} back. 429 and 5xx
+    replies raise TransientLLMError. Used with the fake server in
+    benchmarks/ and for self-hosted models.
+    """
+
+    def __init__(self, url: str, model_name: str = "http", client=None):
+        import httpx
+
+        self.url = url
+        self.model_name = model_name
+        self._client = client or httpx.AsyncClient(timeout=60)
+
+    async def generate(self, prompt: str) -> str:
+        response = await self._client.post(self.url, json={"prompt": prompt})
+        if response.status_code == 429 or response.status_code >= 500:
+            retry_after = response.headers.get("Retry-After")
+            raise TransientLLMError(
+                f"HTTP {response.status_code} from {self.url}",
+                retry_after=float(retry_after) if retry_after else None,
+            )
+        response.raise_for_status()
+        return response.json()["text"]
+
+
+class TokenBucket:
+    # Allows `rate` acquisitions per second on average, bursting to `burst`
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.capacity = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.capacity, self._tokens + (now - self._updated) * self.rate
+                )
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class ResilientLLMBackend(LLMBackend):
+    """Wraps a backend with client-side rate limiting and retries.
+
+    Every attempt takes a token from `rate_limiter` and has its latency
+    recorded in metrics; TransientLLMError is retried with exponential
+    backoff and jitter, honouring retry_after.
+    """
+
+    def __init__(
+        self,
+        backend: LLMBackend,
+        rate_limiter: TokenBucket = None,
+        max_retries: int = 5,
+        base_delay: float = 0.5,
+        max_delay: float = 30.0,
+    ):
+        self.backend = backend
+        self.model_name = backend.model_name
+        self.rate_limiter = rate_limiter
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.stats = {"calls": 0, "retries": 0, "transient_errors": 0}
+
+    async def generate(self, prompt: str) -> str:
+        for attempt in range(self.max_retries + 1):
+            if self.rate_limiter is not None:
+                await self.rate_limiter.acquire()
+            self.stats["calls"] += 1
+            start = time.perf_counter()
+            try:
+                content = await self.backend.generate(prompt)
+                self._observe("generate", "ok", start)
+                return content
+            except TransientLLMError as exc:
+                self._observe("generate", "transient", start)
+                self.stats["transient_errors"] += 1
+                if attempt == self.max_retries:
+                    raise
+                self.stats["retries"] += 1
+                await asyncio.sleep(self._retry_delay(exc, attempt))
+            except Exception:
+                self._observe("generate", "error", start)
+                raise
+
+    async def stream(self, prompt: str):
+        for attempt in range(self.max_retries + 1):
+            if self.rate_limiter is not None:
+                await self.rate_limiter.acquire()
+            self.stats["calls"] += 1
+            started = False
+            start = time.perf_counter()
+            try:
+                async with aclosing(self.backend.stream(prompt)) as chunks:
+                    async for chunk in chunks:
+                        started = True
+                        yield chunk
+                self._observe("stream", "ok", start)
+                return
+            except TransientLLMError as exc:
+                self._observe("stream", "transient", start)
+                self.stats["transient_errors"] += 1
+                # Chunks already relayed can't be taken back, so only a call
+                # that failed before producing any text is retried
+                if started or attempt == self.max_retries:
+                    raise
+                self.stats["retries"] += 1
+                await asyncio.sleep(self._retry_delay(exc, attempt))
+            except Exception:
+                self._observe("stream", "error", start)
+                raise
+
+    def _observe(self, call: str, outcome: str, start: float):
+        LLM_DURATION.observe(
+            time.perf_counter() - start,
+            model=self.model_name,
+            call=call,
+            outcome=outcome,
+        )
+
+    def _retry_delay(self, exc: TransientLLMError, attempt: int) -> float:
+        if exc.retry_after is not None:
+            return exc.retry_after
+        delay = min(self.max_delay, self.base_delay * 2**attempt)
+        return delay * random.uniform(0.5, 1.0)
+
+
+def create_llm_backend(name: str = None) -> LLMBackend:
+    # LLM_BACKEND selects the backend; the stub keeps the app usable offline
+    name = name or os.getenv("LLM_BACKEND", "stub")
+    if name == "stub":
+        backend = StubLLMBackend(
+            latency=float(os.getenv("LLM_STUB_LATENCY", "0")),
+            chunk_delay=float(os.getenv("LLM_STUB_CHUNK_DELAY", "0")),
+        )
+    elif name == "gemini":
+        from gemini import GeminiBackend
+
+        backend = GeminiBackend(os.getenv("GEMINI_MODEL", "gemini-1.5-flash"))
+    elif name == "http":
+        backend = HTTPLLMBackend(
+            os.environ["LLM_HTTP_URL"], os.getenv("LLM_HTTP_MODEL", "http")
+        )
+    else:
+        raise ValueError(f"Unknown LLM backend: {name}")
+
+    # LLM_RATE_LIMIT=0 disables the client-side rate limit
+    rate = float(os.getenv("LLM_RATE_LIMIT", "5"))
+    return ResilientLLMBackend(
+        backend,
+        rate_limiter=TokenBucket(rate, int(os.getenv("LLM_BURST", "5"))) if rate else None,
+        max_retries=int(os.getenv("LLM_MAX_RETRIES", "5")),
+    )
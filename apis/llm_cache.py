@@ -0,0 +1,126 @@
+import hashlib
+import os
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from database.database_creation import LLMCacheEntry
+from database.utils import AsyncSessionLocal
+
+LLM_CACHE_MEMORY_ENTRIES = int(os.getenv("LLM_CACHE_MEMORY_ENTRIES", "1024"))
+LLM_CACHE_TTL = timedelta(days=int(os.getenv("LLM_CACHE_TTL_DAYS", "30")))
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+
+def response_cache_key(survey, template_version: str, model_name: str) -> str:
+    # The packed item vector is already a normalized form of the answers;
+    # surveys without item data fall back to their total score
+    vector = survey.packed_responses or f"total:{survey.total_score}".encode()
+    digest = hashlib.sha256()
+    for part in (vector, template_version.encode(), model_name.encode()):
+        digest.update(len(part).to_bytes(4, "big"))
+        digest.update(part)
+    return digest.hexdigest()
+
+
+class LLMResponseCache:
+    """Two-tier cache of generated texts: an in-process LRU in front of the
+    `llm_cache` table, which applies a TTL and a total size limit."""
+
+    def __init__(
+        self,
+        session_factory=AsyncSessionLocal,
+        memory_entries: int = LLM_CACHE_MEMORY_ENTRIES,
+        ttl: timedelta = LLM_CACHE_TTL,
+        max_bytes: int = LLM_CACHE_MAX_BYTES,
+    ):
+        self.session_factory = session_factory
+        self.memory_entries = memory_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._memory = OrderedDict()
+        self.stats = {"memory_hits": 0, "db_hits": 0, "misses": 0, "evictions": 0}
+
+    def _remember(self, key: str, content: str, created_at: datetime):
+        self._memory[key] = (content, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def snapshot(self) -> dict:
+        return {**self.stats, "memory_entries": len(self._memory)}
+
+    async def get(self, key: str):
+        cutoff = datetime.utcnow() - self.ttl
+
+        cached = self._memory.get(key)
+        if cached is not None and cached[1] >= cutoff:
+            self._memory.move_to_end(key)
+            self.stats["memory_hits"] += 1
+            return cached[0]
+
+        async with self.session_factory() as db:
+            result = await db.execute(
+                select(LLMCacheEntry.content, LLMCacheEntry.created_at).where(
+                    LLMCacheEntry.key == key, LLMCacheEntry.created_at >= cutoff
+                )
+            )
+            row = result.first()
+
+        if row is None:
+            self._memory.pop(key, None)
+            self.stats["misses"] += 1
+            return None
+
+        self._remember(key, row.content, row.created_at)
+        self.stats["db_hits"] += 1
+        return row.content
+
+    async def put(self, key: str, content: str, model_name: str):
+        now = datetime.utcnow()
+        self._remember(key, content, now)
+
+        size = len(content.encode())
+        stmt = sqlite_insert(LLMCacheEntry).values(
+            key=key, model_name=model_name, content=content, size=size, created_at=now
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[LLMCacheEntry.key],
+            set_={"content": content, "size": size, "created_at": now},
+        )
+        async with self.session_factory() as db:
+            await db.execute(stmt)
+            await self._evict(db, now)
+            await db.commit()
+
+    async def _evict(self, db, now: datetime):
+        # Expired entries first, then the oldest ones until under max_bytes
+        result = await db.execute(
+            delete(LLMCacheEntry).where(LLMCacheEntry.created_at < now - self.ttl)
+        )
+        self.stats["evictions"] += result.rowcount
+
+        total = (await db.execute(select(func.sum(LLMCacheEntry.size)))).scalar() or 0
+        if total <= self.max_bytes:
+            return
+
+        result = await db.execute(
+            select(LLMCacheEntry.key, LLMCacheEntry.size).order_by(
+                LLMCacheEntry.created_at
+            )
+        )
+        evicted = []
+        for key, size in result:
+            if total <= self.max_bytes:
+                break
+            evicted.append(key)
+            total -= size
+        await db.execute(delete(LLMCacheEntry).where(LLMCacheEntry.key.in_(evicted)))
+        for key in evicted:
+            self._memory.pop(key, None)
+        self.stats["evictions"] += len(evicted)
+
+
+llm_cache = LLMResponseCache()
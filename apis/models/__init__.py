@@ -1,2 +1,5 @@
 from .user import *
 from .lsas import *
+from .recommendation import *
+from .progress import *
+from .exercise import *
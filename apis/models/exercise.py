@@ -0,0 +1,45 @@
+from datetime import datetime
+from typing import List, Optional
+
+from pydantic import BaseModel, ConfigDict, Field
+
+
+class ExerciseBulkAssign(BaseModel):
+    # One exercise assigned to several patients at once
+    content: str
+    patient_ids: List[int] = Field(min_length=1, max_length=1000)
+
+
+class ExerciseResponse(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    patient_id: int
+    assigned_date: datetime
+    content: str
+    completed: bool
+    completion_date: Optional[datetime] = None
+
+
+class ExerciseFeed(BaseModel):
+    completed: bool
+    exercises: List[ExerciseResponse]
+    next_cursor: Optional[str] = None
+
+
+class PatientExerciseCompletion(BaseModel):
+    patient_id: int
+    patient_name: Optional[str]
+    assigned: int
+    completed: int
+    completion_rate: Optional[float]
+
+
+class DoctorExerciseCompletion(BaseModel):
+    doctor_id: int
+    since: Optional[datetime] = None
+    assigned: int
+    completed: int
+    # None when nothing was assigned
+    completion_rate: Optional[float]
+    patients: List[PatientExerciseCompletion]
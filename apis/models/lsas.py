@@ -1,4 +1,5 @@
 import enum
+from bisect import bisect_right
 from enum import Enum
 from typing import List, Dict
 from pydantic import BaseModel
@@ -14,19 +15,12 @@ class AnxietyLevel(str, enum.Enum):
     VERY_SEVERE = "Very severe social anxiety"
 
 
+# Lower score bound of every AnxietyLevel after NONE, in declaration order
+ANXIETY_LEVEL_THRESHOLDS = [30, 50, 65, 80, 95]
+
+
 def get_anxiety_level(score: int) -> AnxietyLevel:
-    if score < 30:
-        return AnxietyLevel.NONE
-    elif score < 50:
-        return AnxietyLevel.MILD
-    elif score < 65:
-        return AnxietyLevel.MODERATE
-    elif score < 80:
-        return AnxietyLevel.MARKED
-    elif score < 95:
-        return AnxietyLevel.SEVERE
-    else:
-        return AnxietyLevel.VERY_SEVERE
+    return list(AnxietyLevel)[bisect_right(ANXIETY_LEVEL_THRESHOLDS, score)]
 
 
 class FearLevel(str, Enum):
@@ -54,3 +48,67 @@ class LSASQuestions(BaseModel):
     questions: List[Question]
     fear_scale: Dict[str, str]
     avoidance_scale: Dict[str, str]
+
+
+# The LSAS question bank, shared by the questionnaire endpoint and survey
+# validation
+LSAS_SITUATIONS = [
+    {"id": 1, "situation": "Using a telephone in public"},
+    {"id": 2, "situation": "Participating in a small group activity"},
+    {"id": 3, "situation": "Eating in public"},
+    {"id": 4, "situation": "Drinking with others"},
+    {"id": 5, "situation": "Talking to someone in authority"},
+    {
+        "id": 6,
+        "situation": "Acting, performing, or speaking in front of an audience",
+    },
+    {"id": 7, "situation": "Going to a party"},
+    {"id": 8, "situation": "Working while being observed"},
+    {"id": 9, "situation": "Writing while being observed"},
+    {"id": 10, "situation": "Calling someone you don't know very well"},
+    {
+        "id": 11,
+        "situation": "Talking face to face with someone you don't know very well",
+    },
+    {"id": 12, "situation": "Meeting strangers"},
+    {"id": 13, "situation": "Urinating in a public bathroom"},
+    {"id": 14, "situation": "Entering a room when others are already seated"},
+    {"id": 15, "situation": "Being the center of attention"},
+    {"id": 16, "situation": "Speaking up at a meeting"},
+    {"id": 17, "situation": "Taking a test of your ability, skill, or knowledge"},
+    {
+        "id": 18,
+        "situation": "Expressing disagreement or disapproval to someone you don't know very well",
+    },
+    {
+        "id": 19,
+        "situation": "Looking someone who you don't know very well straight in the eyes",
+    },
+    {"id": 20, "situation": "Giving a prepared oral talk to a group"},
+    {
+        "id": 21,
+        "situation": "Trying to make someone's acquaintance for the purpose of a romantic/sexual relationship",
+    },
+    {"id": 22, "situation": "Returning goods to a store for a refund"},
+    {"id": 23, "situation": "Giving a party"},
+    {"id": 24, "situation": "Resisting a high pressure sales person"},
+]
+
+LSAS_QUESTION_IDS = [q["id"] for q in LSAS_SITUATIONS]
+
+FEAR_SCALE = {"0": "None", "1": "Mild", "2": "Moderate", "3": "Severe"}
+AVOIDANCE_SCALE = {"0": "Never", "1": "Occasionally", "2": "Often", "3": "Usually"}
+
+LSAS_QUESTIONS = LSASQuestions(
+    questions=[
+        Question(
+            id=q["id"],
+            situation=q["situation"],
+            fear_options=[level.value for level in FearLevel],
+            avoidance_options=[level.value for level in AvoidanceLevel],
+        )
+        for q in LSAS_SITUATIONS
+    ],
+    fear_scale=FEAR_SCALE,
+    avoidance_scale=AVOIDANCE_SCALE,
+)
@@ -0,0 +1,53 @@
+from datetime import date, datetime
+from typing import List, Optional
+
+from pydantic import BaseModel, Field
+
+
+# Response models for survey history and analytics. Fields are filled from
+# query rows (see database.queries.rows_as_dicts), so the survey columns are
+# the validation aliases.
+class LSASScorePoint(BaseModel):
+    date: datetime = Field(validation_alias="submission_date")
+    score: int = Field(validation_alias="total_score")
+    anxiety_level: str
+
+
+class LSASHistoryPoint(LSASScorePoint):
+    # History can include archived months; those points carry the month's
+    # mean score and the number of surveys it stands for
+    survey_count: Optional[int] = None
+
+
+class LSASScoreBucket(BaseModel):
+    period_start: date
+    count: int
+    min_score: int
+    mean_score: float
+    max_score: int
+
+
+class LSASProgress(BaseModel):
+    timeframe: str
+    bucket: str
+    since: datetime
+    buckets: List[LSASScoreBucket]
+    surveys: List[LSASHistoryPoint]
+    next_cursor: Optional[str] = None
+
+
+class PatientLatestSurvey(BaseModel):
+    patient_id: int
+    patient_name: Optional[str]
+    latest_survey: Optional[LSASScorePoint]
+
+
+class PatientAnalytics(BaseModel):
+    total_surveys: int
+    average_score: float
+    highest_score: int
+    lowest_score: int
+    current_anxiety_level: Optional[str]
+    # Only present with include_history
+    score_history: Optional[List[LSASHistoryPoint]] = None
+    next_cursor: Optional[str] = None
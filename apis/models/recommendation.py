@@ -0,0 +1,48 @@
+import enum
+from datetime import datetime
+from typing import Optional
+
+from pydantic import BaseModel, ConfigDict
+
+
+class JobStatus(str, enum.Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+
+class RecommendationResponse(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    survey_id: int
+    content: str
+    created_at: datetime
+    selected: bool
+
+
+class RecommendationJobResponse(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    survey_id: int
+    status: JobStatus
+    error: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    recommendation: Optional[RecommendationResponse] = None
+
+
+class RecommendationBatchProgress(BaseModel):
+    id: int
+    doctor_id: int
+    total_jobs: int
+    concurrency: int
+    created_at: datetime
+    queued: int = 0
+    running: int = 0
+    done: int = 0
+    failed: int = 0
+    finished: bool
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, ConfigDict, EmailStr, Field
-from typing import List, Annotated
+from typing import List, Annotated, Optional
 from datetime import datetime
 
 
@@ -24,8 +24,7 @@ class DoctorResponse(BaseModel):
     name: str
     specialization: str
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class PatientCreate(BaseModel):
@@ -43,8 +42,7 @@ class PatientResponse(BaseModel):
     name: str
     doctor_id: int
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 # Pydantic models for request validation
@@ -125,6 +123,24 @@ class LSASSurveyResult(BaseModel):
     submission_date: datetime
     total_score: int
     anxiety_level: str
+    recommendation_job_id: Optional[int] = None
+
+
+class LSASSurveyImport(LSASSurveyResponse):
+    # One NDJSON line of a bulk import
+    patient_id: int
+    submission_date: Optional[datetime] = None
+
+
+class LSASBulkImportError(BaseModel):
+    line: int
+    detail: str
+
+
+class LSASBulkImportResult(BaseModel):
+    inserted: int
+    failed: int
+    errors: List[LSASBulkImportError]
 
 
 class ExerciseAssign(BaseModel):
@@ -0,0 +1,77 @@
+import hashlib
+import os
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+
+from models.lsas import LSAS_SITUATIONS
+
+PROMPTS_DIR = Path(
+    os.getenv("PROMPTS_DIR", Path(__file__).resolve().parent.parent / "prompts")
+)
+
+RESULTS_TEMPLATE = "LSAS_results_template"
+_SLOT = "Fear: Avoidance:"
+
+
+def _compile_results_template(template: str) -> str:
+    """Turn LSAS_results_template.txt into a str.format pattern.
+
+    Each of the 24 situation lines and the final total line end with
+    "Fear: Avoidance:"; those become "Fear: {} Avoidance: {}" slots.
+    """
+    lines = template.replace("{", "{{").replace("}", "}}").split("\n")
+    slots = 0
+    for index, line in enumerate(lines):
+        if line.rstrip().endswith(_SLOT):
+            lines[index] = line.rstrip()[: -len(_SLOT)] + "Fear: {} Avoidance: {}"
+            slots += 1
+
+    # One slot per situation plus the totals line
+    if slots != len(LSAS_SITUATIONS) + 1:
+        raise ValueError(
+            f"{RESULTS_TEMPLATE}.txt has {slots} slots, "
+            f"expected {len(LSAS_SITUATIONS) + 1}"
+        )
+    return "\n".join(lines)
+
+
+class PromptRegistry:
+    """All prompt files from prompts/, read and compiled once.
+
+    `version` hashes every template, so caches keyed on it are invalidated
+    whenever a prompt file changes.
+    """
+
+    def __init__(self, directory: Path = PROMPTS_DIR):
+        self.templates = {
+            path.stem: path.read_text(encoding="utf-8")
+            for path in sorted(Path(directory).glob("*.txt"))
+        }
+
+        digest = hashlib.sha256()
+        for name, text in self.templates.items():
+            digest.update(name.encode())
+            digest.update(text.encode())
+        self.version = digest.hexdigest()[:16]
+
+        self._results_pattern = _compile_results_template(
+            self.templates[RESULTS_TEMPLATE]
+        )
+
+    def sample_results(self, level: str) -> str:
+        # Example responses shipped per severity ('mild' ... 'very_severe')
+        return self.templates[f"LSAS_results_{level}"]
+
+    def render_results(self, ratings) -> str:
+        # `ratings` is a (24, 2) sequence of (fear, avoidance) per situation
+        values = np.asarray(ratings, dtype=np.int64).ravel().tolist()
+        fear_total = sum(values[0::2])
+        avoidance_total = sum(values[1::2])
+        return self._results_pattern.format(*values, fear_total, avoidance_total)
+
+
+@lru_cache(maxsize=None)
+def get_prompt_registry() -> PromptRegistry:
+    return PromptRegistry()
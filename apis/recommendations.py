@@ -0,0 +1,317 @@
+import asyncio
+import logging
+import os
+from contextlib import aclosing
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, insert, select, update
+
+from database.database_creation import (
+    LSASSurvey,
+    Recommendation,
+    RecommendationBatch,
+    RecommendationJob,
+)
+from database.lsas_responses import unpack_responses
+from database.queries import latest_surveys_for_doctor
+from database.utils import AsyncSessionLocal
+from gemini import PROMPT_TEMPLATE_VERSION, create_prompt
+from llm import create_llm_backend
+from llm_cache import llm_cache, response_cache_key
+from models.recommendation import JobStatus
+from prompt_templates import get_prompt_registry
+
+logger = logging.getLogger(__name__)
+
+RECOMMENDATION_WORKERS = int(os.getenv("RECOMMENDATION_WORKERS", "4"))
+# Jobs left running this long (e.g. by a crashed process) are queued again
+STALE_JOB_AFTER = timedelta(minutes=10)
+
+
+def format_lsas_responses(survey) -> str:
+    # Item answers rendered into prompts/LSAS_results_template.txt
+    if survey.packed_responses is None:
+        return f"Total LSAS score: {survey.total_score} ({survey.anxiety_level})"
+
+    ratings = unpack_responses([survey.packed_responses])[0]
+    return get_prompt_registry().render_results(ratings)
+
+
+def build_survey_prompt(survey) -> str:
+    return create_prompt(format_lsas_responses(survey))
+
+
+def prompt_version() -> str:
+    return f"{PROMPT_TEMPLATE_VERSION}:{get_prompt_registry().version}"
+
+
+def create_recommendation_batch(db, doctor_id: int, concurrency: int):
+    """Queue one job per patient of the doctor, for their latest survey.
+
+    Returns the batch and its job ids; patients without surveys are skipped.
+    The caller commits.
+    """
+    rows = db.execute(latest_surveys_for_doctor(doctor_id, limit=None)).all()
+    survey_ids = [row.survey_id for row in rows if row.survey_id is not None]
+
+    batch = RecommendationBatch(
+        doctor_id=doctor_id, total_jobs=len(survey_ids), concurrency=concurrency
+    )
+    db.add(batch)
+    db.flush()
+
+    if not survey_ids:
+        return batch, []
+
+    result = db.execute(
+        insert(RecommendationJob).returning(RecommendationJob.id),
+        [
+            {"survey_id": survey_id, "batch_id": batch.id, "status": "queued"}
+            for survey_id in survey_ids
+        ],
+    )
+    return batch, result.scalars().all()
+
+
+def batch_progress_query(batch_id: int):
+    return (
+        select(RecommendationJob.status, func.count(RecommendationJob.id))
+        .where(RecommendationJob.batch_id == batch_id)
+        .group_by(RecommendationJob.status)
+    )
+
+
+class RecommendationWorkerPool:
+    """Bounded pool of asyncio workers generating recommendations.
+
+    Jobs are rows in `recommendation_jobs`; the in-memory queue only carries
+    their ids, so queued jobs survive restarts and are reloaded on start.
+    """
+
+    def __init__(
+        self,
+        backend_factory=create_llm_backend,
+        workers: int = RECOMMENDATION_WORKERS,
+        session_factory=AsyncSessionLocal,
+        cache=llm_cache,
+    ):
+        self.backend_factory = backend_factory
+        self.workers = workers
+        self.session_factory = session_factory
+        self.cache = cache
+        self.backend = None
+        self.stats = {"generated": 0, "cache_hits": 0, "deduplicated": 0}
+        self._loop = None
+        self._queue = None
+        self._tasks = []
+        self._batch_tasks = set()
+        # Generations in flight by cache key, so identical prompts running
+        # at the same time share one LLM call
+        self._inflight = {}
+
+    async def start(self):
+        self.backend = self.backend_factory()
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+        self._tasks = [
+            asyncio.create_task(self._work()) for _ in range(self.workers)
+        ]
+        for job_id in await self._pending_job_ids():
+            self._queue.put_nowait(job_id)
+
+    async def stop(self):
+        tasks = self._tasks + list(self._batch_tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks = []
+        self._batch_tasks = set()
+        self._loop = None
+
+    async def join(self):
+        # Wait until every queued job and submitted batch has been processed
+        await self._queue.join()
+        while self._batch_tasks:
+            await asyncio.gather(*self._batch_tasks, return_exceptions=True)
+
+    def enqueue(self, job_id: int):
+        # Callable from sync handlers running in the threadpool. Without a
+        # running pool the job stays queued in the database until next start.
+        if self._loop is None:
+            return
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, job_id)
+
+    def submit_batch(self, job_ids, concurrency: int):
+        # Like enqueue: callable from the threadpool, and without a running
+        # pool the jobs are picked up from the database at next start
+        if self._loop is None:
+            return
+        self._loop.call_soon_threadsafe(self._start_batch, job_ids, concurrency)
+
+    def _start_batch(self, job_ids, concurrency: int):
+        task = asyncio.create_task(self.run_batch(job_ids, concurrency))
+        self._batch_tasks.add(task)
+        task.add_done_callback(self._batch_tasks.discard)
+
+    async def run_batch(self, job_ids, concurrency: int):
+        # Batches bypass the shared queue and run with their own concurrency;
+        # the backend's rate limiter still applies across everything
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def run(job_id):
+            async with semaphore:
+                try:
+                    await self.run_job(job_id)
+                except Exception:
+                    logger.exception("Recommendation job %s crashed", job_id)
+
+        await asyncio.gather(*(run(job_id) for job_id in job_ids))
+
+    async def _pending_job_ids(self):
+        async with self.session_factory() as db:
+            await db.execute(
+                update(RecommendationJob)
+                .where(
+                    RecommendationJob.status == JobStatus.RUNNING.value,
+                    RecommendationJob.started_at < datetime.utcnow() - STALE_JOB_AFTER,
+                )
+                .values(status=JobStatus.QUEUED.value)
+            )
+            await db.commit()
+            result = await db.execute(
+                select(RecommendationJob.id)
+                .where(RecommendationJob.status == JobStatus.QUEUED.value)
+                .order_by(RecommendationJob.id)
+            )
+            return result.scalars().all()
+
+    async def _work(self):
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self.run_job(job_id)
+            except Exception:
+                logger.exception("Recommendation job %s crashed", job_id)
+            finally:
+                self._queue.task_done()
+
+    async def _finish(self, db, job_id: int, **values):
+        await db.execute(
+            update(RecommendationJob)
+            .where(RecommendationJob.id == job_id)
+            .values(finished_at=datetime.utcnow(), **values)
+        )
+        await db.commit()
+
+    async def _generate(self, survey) -> str:
+        cache_key = response_cache_key(
+            survey, prompt_version(), self.backend.model_name
+        )
+        if self.cache is not None:
+            content = await self.cache.get(cache_key)
+            if content is not None:
+                self.stats["cache_hits"] += 1
+                return content
+
+        inflight = self._inflight.get(cache_key)
+        if inflight is not None:
+            self.stats["deduplicated"] += 1
+            return await asyncio.shield(inflight)
+
+        future = asyncio.get_running_loop().create_future()
+        # Avoid "exception never retrieved" warnings when nobody was waiting
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._inflight[cache_key] = future
+        try:
+            content = await self.backend.generate(build_survey_prompt(survey))
+            if self.cache is not None:
+                await self.cache.put(cache_key, content, self.backend.model_name)
+            self.stats["generated"] += 1
+            future.set_result(content)
+            return content
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        finally:
+            del self._inflight[cache_key]
+
+    async def stream_text(self, survey):
+        """Yield the survey's recommendation text as the model produces it.
+
+        A cached text is yielded in one piece. The full text is cached once
+        the model finishes; a consumer that stops early closes the upstream
+        call and nothing is cached.
+        """
+        cache_key = response_cache_key(
+            survey, prompt_version(), self.backend.model_name
+        )
+        if self.cache is not None:
+            content = await self.cache.get(cache_key)
+            if content is not None:
+                self.stats["cache_hits"] += 1
+                yield content
+                return
+
+        chunks = []
+        async with aclosing(self.backend.stream(build_survey_prompt(survey))) as stream:
+            async for chunk in stream:
+                chunks.append(chunk)
+                yield chunk
+
+        content = "".join(chunks)
+        if self.cache is not None:
+            await self.cache.put(cache_key, content, self.backend.model_name)
+        self.stats["generated"] += 1
+
+    async def save_recommendation(self, survey_id: int, content: str) -> Recommendation:
+        async with self.session_factory() as db:
+            recommendation = Recommendation(survey_id=survey_id, content=content)
+            db.add(recommendation)
+            await db.commit()
+            return recommendation
+
+    async def run_job(self, job_id: int):
+        async with self.session_factory() as db:
+            # Claim the job so no other worker or process runs it as well
+            claimed = await db.execute(
+                update(RecommendationJob)
+                .where(
+                    RecommendationJob.id == job_id,
+                    RecommendationJob.status == JobStatus.QUEUED.value,
+                )
+                .values(status=JobStatus.RUNNING.value, started_at=datetime.utcnow())
+            )
+            await db.commit()
+            if claimed.rowcount != 1:
+                return
+
+            result = await db.execute(
+                select(LSASSurvey)
+                .join(RecommendationJob, RecommendationJob.survey_id == LSASSurvey.id)
+                .where(RecommendationJob.id == job_id)
+            )
+            survey = result.scalar_one()
+            # No transaction is held open while the model is generating
+            await db.commit()
+
+            try:
+                content = await self._generate(survey)
+            except Exception as exc:
+                logger.warning("Recommendation job %s failed: %s", job_id, exc)
+                await self._finish(
+                    db, job_id, status=JobStatus.FAILED.value, error=str(exc)[:500]
+                )
+                return
+
+            recommendation = Recommendation(survey_id=survey.id, content=content)
+            db.add(recommendation)
+            await db.flush()
+            await self._finish(
+                db,
+                job_id,
+                status=JobStatus.DONE.value,
+                recommendation_id=recommendation.id,
+            )
+
+
+recommendation_pool = RecommendationWorkerPool()
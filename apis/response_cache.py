@@ -0,0 +1,365 @@
+"""Read-through cache for the patient and doctor views the frontend polls.
+
+Every cached value belongs to a scope, "patient:<id>" or "doctor:<id>", and
+the write handlers that change a view invalidate its scope. Invalidation
+bumps a per-scope generation that is read before the view is loaded: a
+value loaded concurrently with a write is then discarded instead of being
+stored stale. Invalidating ALL_SCOPES drops every entry; database.loader
+and database.retention do that after changing data outside the API. Entries
+also expire after RESPONSE_CACHE_TTL_SECONDS, which bounds staleness where
+an invalidation cannot reach (the memory backend of another process).
+
+RESPONSE_CACHE_BACKEND picks where entries live:
+  memory  per-process LRU (default). Only coherent with a single worker.
+  sqlite  a local SQLite file (RESPONSE_CACHE_PATH) shared by every worker
+          on the host, so an invalidation in one is seen by all.
+  off     no caching.
+"""
+import functools
+import inspect
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from datetime import date, datetime
+
+from fastapi import params
+from fastapi.concurrency import run_in_threadpool
+
+RESPONSE_CACHE_BACKEND = os.getenv("RESPONSE_CACHE_BACKEND", "memory")
+RESPONSE_CACHE_PATH = os.getenv("RESPONSE_CACHE_PATH", "./response_cache.db")
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "10000"))
+RESPONSE_CACHE_TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "60"))
+
+# Returned by backend lookups that find nothing usable
+MISS = object()
+# Scope whose invalidation invalidates every scope
+ALL_SCOPES = "*"
+
+
+def patient_scope(patient_id: int) -> str:
+    return f"patient:{patient_id}"
+
+
+def doctor_scope(doctor_id: int) -> str:
+    return f"doctor:{doctor_id}"
+
+
+class MemoryBackend:
+    """In-process LRU. Values are stored as returned, without copying."""
+
+    # Cheap enough to call on the event loop
+    blocking = False
+
+    def __init__(self, max_entries: int = RESPONSE_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        # (scope, key) -> (expires_at, value), least recently used first
+        self._entries = OrderedDict()
+        self._scopes = defaultdict(set)
+        self._generations = {}
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def _generation(self, scope: str) -> int:
+        # Bumped by invalidating the scope or ALL_SCOPES
+        return self._generations.get(scope, 0) + self._generations.get(ALL_SCOPES, 0)
+
+    def lookup(self, scope: str, key: str, now: float):
+        # -> (value or MISS, the scope's current generation)
+        with self._lock:
+            generation = self._generation(scope)
+            entry = self._entries.get((scope, key))
+            if entry is None:
+                return MISS, generation
+            if entry[0] <= now:
+                self._remove((scope, key))
+                return MISS, generation
+            self._entries.move_to_end((scope, key))
+            return entry[1], generation
+
+    def store(self, scope: str, key: str, generation: int, value, expires_at: float):
+        with self._lock:
+            if self._generation(scope) != generation:
+                # Invalidated while the value was loading
+                return
+            self._entries[(scope, key)] = (expires_at, value)
+            self._entries.move_to_end((scope, key))
+            self._scopes[scope].add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, scope: str):
+        with self._lock:
+            self._generations[scope] = self._generations.get(scope, 0) + 1
+            if scope == ALL_SCOPES:
+                self._entries.clear()
+                self._scopes.clear()
+                return
+            for key in self._scopes.pop(scope, ()):
+                self._entries.pop((scope, key), None)
+
+    def _remove(self, entry_key):
+        del self._entries[entry_key]
+        scope, key = entry_key
+        keys = self._scopes.get(scope)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._scopes[scope]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+class SQLiteBackend:
+    """LRU in a SQLite file shared by every worker process on the host.
+
+    Values are stored as JSON (dates become ISO strings, which the routes'
+    response models parse back). The file is disposable: it is not synced
+    to disk and can be deleted while the app is stopped. Calls can wait on
+    another worker's write lock, so ResponseCache makes them from the
+    threadpool, never on the event loop.
+    """
+
+    blocking = True
+
+    # Entries over max_entries are trimmed every this many stores
+    TRIM_EVERY = 100
+
+    def __init__(
+        self, path: str = RESPONSE_CACHE_PATH, max_entries: int = RESPONSE_CACHE_MAX_ENTRIES
+    ):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._stores = 0
+        self.evictions = 0
+        self._connection = None
+
+    @property
+    def _conn(self):
+        # Opened on first use, so importing the app creates no file
+        if self._connection is None:
+            self._connection = self._connect()
+        return self._connection
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = OFF")
+        conn.execute("PRAGMA busy_timeout = 5000")
+        conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS entries (
+                scope TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                expires_at REAL NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (scope, key)
+            );
+            CREATE INDEX IF NOT EXISTS ix_entries_last_used ON entries (last_used);
+            CREATE TABLE IF NOT EXISTS generations (
+                scope TEXT PRIMARY KEY,
+                generation INTEGER NOT NULL
+            );
+            """
+        )
+        return conn
+
+    def _generation(self, scope: str) -> int:
+        # Bumped by invalidating the scope or ALL_SCOPES
+        return self._conn.execute(
+            "SELECT coalesce(sum(generation), 0) FROM generations WHERE scope IN (?, ?)",
+            (scope, ALL_SCOPES),
+        ).fetchone()[0]
+
+    def lookup(self, scope: str, key: str, now: float):
+        with self._lock:
+            generation = self._generation(scope)
+            row = self._conn.execute(
+                "SELECT value FROM entries WHERE scope = ? AND key = ? AND expires_at > ?",
+                (scope, key, now),
+            ).fetchone()
+            if row is None:
+                return MISS, generation
+            self._conn.execute(
+                "UPDATE entries SET last_used = ? WHERE scope = ? AND key = ?",
+                (now, scope, key),
+            )
+            return json.loads(row[0]), generation
+
+    def store(self, scope: str, key: str, generation: int, value, expires_at: float):
+        payload = json.dumps(value, default=_json_default)
+        with self._lock:
+            # Only stored while the generation read before loading is current
+            self._conn.execute(
+                """
+                INSERT OR REPLACE INTO entries (scope, key, value, expires_at, last_used)
+                SELECT ?, ?, ?, ?, ?
+                WHERE (
+                    SELECT coalesce(sum(generation), 0) FROM generations
+                    WHERE scope IN (?, ?)
+                ) = ?
+                """,
+                (
+                    scope,
+                    key,
+                    payload,
+                    expires_at,
+                    time.time(),
+                    scope,
+                    ALL_SCOPES,
+                    generation,
+                ),
+            )
+            self._stores += 1
+            if self._stores % self.TRIM_EVERY == 0:
+                self._trim()
+
+    def _trim(self):
+        excess = len(self) - self.max_entries
+        if excess > 0:
+            cursor = self._conn.execute(
+                """
+                DELETE FROM entries WHERE rowid IN (
+                    SELECT rowid FROM entries ORDER BY last_used LIMIT ?
+                )
+                """,
+                (excess,),
+            )
+            self.evictions += cursor.rowcount
+
+    def invalidate(self, scope: str):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    """
+                    INSERT INTO generations (scope, generation) VALUES (?, 1)
+                    ON CONFLICT (scope) DO UPDATE SET generation = generation + 1
+                    """,
+                    (scope,),
+                )
+                if scope == ALL_SCOPES:
+                    self._conn.execute("DELETE FROM entries")
+                else:
+                    self._conn.execute("DELETE FROM entries WHERE scope = ?", (scope,))
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def __len__(self):
+        return self._conn.execute("SELECT count(*) FROM entries").fetchone()[0]
+
+
+class ResponseCache:
+    def __init__(self, backend=None, ttl: float = RESPONSE_CACHE_TTL_SECONDS):
+        # No backend disables caching
+        self.backend = backend
+        self.ttl = ttl
+        self.stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+    def snapshot(self) -> dict:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        if self.backend is None:
+            return {"backend": None, **self.stats, "hit_ratio": None}
+        return {
+            "backend": type(self.backend).__name__,
+            **self.stats,
+            "hit_ratio": self.stats["hits"] / lookups if lookups else None,
+            "evictions": self.backend.evictions,
+            "entries": len(self.backend),
+            "ttl_seconds": self.ttl,
+        }
+
+    async def get_or_load(self, scope: str, key: str, load):
+        """Return the cached value for (scope, key), or await load() and cache it.
+
+        Exceptions from load (e.g. a 404) propagate and are not cached.
+        """
+        if self.backend is None:
+            return await load()
+
+        now = time.time()
+        value, generation = await self._call(self.backend.lookup, scope, key, now)
+        if value is not MISS:
+            self.stats["hits"] += 1
+            return value
+
+        self.stats["misses"] += 1
+        value = await load()
+        await self._call(self.backend.store, scope, key, generation, value, now + self.ttl)
+        return value
+
+    async def _call(self, method, *args):
+        # Backends that may wait on file locks run in the threadpool
+        if self.backend.blocking:
+            return await run_in_threadpool(method, *args)
+        return method(*args)
+
+    async def invalidate(self, *scopes):
+        # Call after the write has committed
+        if self.backend is None:
+            return
+        await self._call(self.invalidate_blocking, *scopes)
+
+    def invalidate_blocking(self, *scopes):
+        # For sync code: routes run in the threadpool and command-line tools
+        if self.backend is None:
+            return
+        for scope in dict.fromkeys(scopes):
+            self.backend.invalidate(scope)
+            self.stats["invalidations"] += 1
+
+    def cached(self, scope_param: str):
+        """Decorator for async read routes, cached under the scope named by
+        `scope_param` ("patient_id" or "doctor_id").
+
+        The key is the route name and its query/path parameters; dependency
+        parameters (the database session) are left out.
+        """
+        kind = scope_param.removesuffix("_id")
+
+        def decorate(endpoint):
+            signature = inspect.signature(endpoint)
+            key_params = [
+                name
+                for name, parameter in signature.parameters.items()
+                if not isinstance(parameter.default, params.Depends)
+            ]
+
+            @functools.wraps(endpoint)
+            async def wrapper(**kwargs):
+                scope = f"{kind}:{kwargs[scope_param]}"
+                key = endpoint.__name__ + json.dumps(
+                    [kwargs.get(name) for name in key_params], default=_json_default
+                )
+                return await self.get_or_load(scope, key, lambda: endpoint(**kwargs))
+
+            return wrapper
+
+        return decorate
+
+
+def create_response_cache(backend: str = RESPONSE_CACHE_BACKEND) -> ResponseCache:
+    if backend == "off":
+        return ResponseCache(None)
+    if backend == "sqlite":
+        return ResponseCache(SQLiteBackend())
+    if backend == "memory":
+        return ResponseCache(MemoryBackend())
+    raise ValueError(f"Unknown RESPONSE_CACHE_BACKEND: {backend!r}")
+
+
+response_cache = create_response_cache()
@@ -0,0 +1,177 @@
+"""Group commit for survey submissions.
+
+SQLite takes one writer at a time, so when every submission commits on its
+own, a burst of check-ins queues on the write lock and pays one fsync each.
+With SURVEY_GROUP_COMMIT=1, submissions are handed to a single writer task
+per process instead. It waits up to SURVEY_BATCH_MAX_DELAY_MS after the
+first pending survey (or until SURVEY_BATCH_MAX_ROWS are pending) and
+inserts the whole batch in one transaction. Each request gets its survey
+id and recommendation job id back without another query.
+"""
+import asyncio
+import logging
+import os
+
+from sqlalchemy import insert, select
+
+from database.database_creation import LSASSurvey, Patient, RecommendationJob
+from database.patient_stats import record_surveys
+from database.utils import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+SURVEY_GROUP_COMMIT = os.getenv("SURVEY_GROUP_COMMIT", "0") == "1"
+SURVEY_BATCH_MAX_ROWS = int(os.getenv("SURVEY_BATCH_MAX_ROWS", "100"))
+SURVEY_BATCH_MAX_DELAY_MS = float(os.getenv("SURVEY_BATCH_MAX_DELAY_MS", "5"))
+
+
+class PatientNotFound(Exception):
+    pass
+
+
+def write_surveys(db, surveys):
+    """Insert surveys and their recommendation jobs; the caller commits.
+
+    `surveys` are dicts of LSASSurvey columns, submission_date included.
+    Returns, in the same order, {"id", "recommendation_job_id", "doctor_id"}
+    per survey, or None where the patient does not exist (nothing is
+    written for it).
+    """
+    patient_ids = {survey["patient_id"] for survey in surveys}
+    doctors = dict(
+        db.execute(
+            select(Patient.id, Patient.doctor_id).where(Patient.id.in_(patient_ids))
+        ).all()
+    )
+    rows = [survey for survey in surveys if survey["patient_id"] in doctors]
+    if not rows:
+        return [None] * len(surveys)
+
+    # RETURNING with executemany; sorted so ids line up with the rows
+    survey_ids = db.scalars(
+        insert(LSASSurvey).returning(LSASSurvey.id, sort_by_parameter_order=True),
+        rows,
+    ).all()
+    record_surveys(db, rows)
+    job_ids = db.scalars(
+        insert(RecommendationJob).returning(
+            RecommendationJob.id, sort_by_parameter_order=True
+        ),
+        [{"survey_id": survey_id, "status": "queued"} for survey_id in survey_ids],
+    ).all()
+
+    written = iter(zip(survey_ids, job_ids))
+    results = []
+    for survey in surveys:
+        if survey["patient_id"] not in doctors:
+            results.append(None)
+            continue
+        survey_id, job_id = next(written)
+        results.append(
+            {
+                "id": survey_id,
+                "recommendation_job_id": job_id,
+                "doctor_id": doctors[survey["patient_id"]],
+            }
+        )
+    return results
+
+
+class SurveyWriter:
+    """Single asyncio task committing queued surveys in batches."""
+
+    def __init__(
+        self,
+        session_factory=SessionLocal,
+        max_rows: int = SURVEY_BATCH_MAX_ROWS,
+        max_delay_ms: float = SURVEY_BATCH_MAX_DELAY_MS,
+    ):
+        self.session_factory = session_factory
+        self.max_rows = max_rows
+        self.max_delay = max_delay_ms / 1000
+        self._queue = None
+        self._full = None
+        self._task = None
+        self.batches = 0
+        self.rows = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    async def start(self):
+        self._queue = asyncio.Queue()
+        self._full = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        # Surveys already queued are still committed
+        if self._task is None:
+            return
+        self._queue.put_nowait(None)
+        await self._task
+        self._task = None
+
+    async def submit(self, survey: dict) -> dict:
+        """Queue one survey; returns its ids once its batch is committed.
+
+        Raises PatientNotFound, or the database error that failed the batch.
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((survey, future))
+        if self._queue.qsize() >= self.max_rows:
+            self._full.set()
+        return await future
+
+    async def _run(self):
+        stopping = False
+        while not stopping:
+            first = await self._queue.get()
+            if first is None:
+                break
+            if self._queue.qsize() + 1 < self.max_rows:
+                try:
+                    await asyncio.wait_for(self._full.wait(), self.max_delay)
+                except TimeoutError:
+                    pass
+            self._full.clear()
+
+            batch = [first]
+            while len(batch) < self.max_rows and not self._queue.empty():
+                item = self._queue.get_nowait()
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self._commit(batch)
+
+    async def _commit(self, batch):
+        surveys = [survey for survey, _ in batch]
+        try:
+            results = await asyncio.to_thread(self._write, surveys)
+        except Exception as exc:
+            logger.exception("Survey batch of %d failed", len(batch))
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+
+        self.batches += 1
+        self.rows += len(batch)
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                # The request went away; its survey is stored regardless
+                continue
+            if result is None:
+                future.set_exception(PatientNotFound())
+            else:
+                future.set_result(result)
+
+    def _write(self, surveys):
+        with self.session_factory() as db:
+            results = write_surveys(db, surveys)
+            db.commit()
+            return results
+
+
+survey_writer = SurveyWriter()